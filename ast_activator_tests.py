@@ -1,18 +1,27 @@
 import unittest
+import importlib.util
 import os
+import re
+import subprocess
+import sys
 import tempfile
-import json
+import orjson
 import numpy as np
 from unittest.mock import patch, Mock
+from types import SimpleNamespace
 from tree_sitter import Node, Tree
 
 # Import the classes to test
+from raid.ast_cache import ASTCache
+from raid import ast_token_activator, raid_pipeline
 from raid.ast_token_activator import JavaASTProcessor, ActivationAnnotator
 
 class TestJavaASTProcessor(unittest.TestCase):
     def setUp(self):
-        # Create a temporary directory for test files
-        self.test_dir = tempfile.mkdtemp()
+        # Create a temporary directory for test files, removed even if setUp fails later
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.test_dir = self._tmp.name
         
         # Create a sample Java file
         self.java_content = """
@@ -28,16 +37,10 @@ class TestJavaASTProcessor(unittest.TestCase):
         
         self.processor = JavaASTProcessor(self.java_file, self.test_dir)
 
-    def tearDown(self):
-        # Clean up temporary files
-        for file in os.listdir(self.test_dir):
-            os.remove(os.path.join(self.test_dir, file))
-        os.rmdir(self.test_dir)
-
     def test_read_source_code(self):
         """Test if source code is read correctly"""
         self.processor.read_source_code()
-        self.assertEqual(self.processor.source_code.strip(), self.java_content.strip())
+        self.assertEqual(self.processor.source_bytes.decode('utf-8').strip(), self.java_content.strip())
 
     def test_parse_source_code(self):
         """Test if source code is parsed into AST"""
@@ -55,9 +58,58 @@ class TestJavaASTProcessor(unittest.TestCase):
             content = f.read().strip()
             self.assertGreater(len(content.split()), 0)
 
+    def test_process_ast_uses_cache(self):
+        """Test if tokens of an unchanged source are served from the cache"""
+        cache = ASTCache(os.path.join(self.test_dir, 'cache.sqlite'))
+        try:
+            JavaASTProcessor(self.java_file, self.test_dir, cache=cache).process_ast()
+            cached = JavaASTProcessor(self.java_file, self.test_dir, cache=cache)
+            with patch.object(JavaASTProcessor, 'parse_source_code') as parse:
+                cached.process_ast()
+            parse.assert_not_called()
+        finally:
+            cache.close()
+        self.processor.process_ast()
+        self.assertEqual(cached.tokens_tuples, self.processor.tokens_tuples)
+
+    def test_batch_process(self):
+        """Test if files processed concurrently match sequential processing"""
+        other_file = os.path.join(self.test_dir, "Other.java")
+        with open(other_file, "w") as f:
+            f.write("class Other { int x = 1; }")
+
+        processors = JavaASTProcessor.batch_process([self.java_file, other_file], self.test_dir, max_workers=2)
+
+        self.processor.process_ast()
+        self.assertEqual(processors[0].tokens_tuples, self.processor.tokens_tuples)
+        self.assertEqual(processors[1].tokens[:3], ["class", "Other", "{"])
+
+    def test_process_file_output_dir(self):
+        """Test if a worker writes the tokens and label files of a file into its own directory"""
+        output_dir = os.path.join(self.test_dir, "Test")
+        cache_path = os.path.join(self.test_dir, "cache.sqlite")
+        tokens_tuples = raid_pipeline.process_file(self.java_file, output_dir, cache_path, "program")
+        self.assertEqual(tokens_tuples[0][1], "public")
+        for name in ("input_sentences.txt", "Test.csv", "Test.in", "Test.label", "Test.bio"):
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, name)), name)
+
+    def test_reparse_keeps_earlier_tree(self):
+        """Test if parsing an edited file leaves the tree of an earlier processor intact"""
+        self.processor.extract_tokens()
+        tokens_tuples = self.processor.tokens_tuples
+        with open(self.java_file, "w") as f:
+            f.write(self.java_content.replace('"Hello"', '"Hello, " + args[0]'))
+
+        edited = JavaASTProcessor(self.java_file, self.test_dir)
+        edited.extract_tokens()
+        self.assertIn("args", edited.tokens)
+        self.assertEqual(self.processor.extract_leaf_tokens(), tokens_tuples)
+
 class TestActivationAnnotator(unittest.TestCase):
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.test_dir = self._tmp.name
         self.annotator = ActivationAnnotator(
             model_name="bert-base-uncased",
             device="cpu",
@@ -67,10 +119,6 @@ class TestActivationAnnotator(unittest.TestCase):
             layer=5
         )
 
-    def tearDown(self):
-        import shutil
-        shutil.rmtree(self.test_dir)
-
     def test_parse_activations(self):
         activation_file = os.path.join(self.test_dir, "test_activations.json")
         
@@ -88,13 +136,13 @@ class TestActivationAnnotator(unittest.TestCase):
             ]
         }
         
-        with open(activation_file, 'w') as f:
-            json.dump(sample_data, f)
+        with open(activation_file, 'wb') as f:
+            f.write(orjson.dumps(sample_data))
 
         # Create a simplified version of parse_activations for testing
         def parse_activations(self, file_path):
-            with open(file_path) as f:
-                data = json.load(f)
+            with open(file_path, 'rb') as f:
+                data = orjson.loads(f.read())
             tokens = []
             activations = []
             for feature in data['features']:
@@ -102,16 +150,41 @@ class TestActivationAnnotator(unittest.TestCase):
                 activations.append(feature['activations'])
             return tokens, activations
 
-        # Monkey patch the method
-        ActivationAnnotator.parse_activations = parse_activations
-
-        tokens, activations = self.annotator.parse_activations(activation_file)
+        # Patch the method for this test only, so later tests see the real one
+        with patch.object(ActivationAnnotator, 'parse_activations', parse_activations):
+            tokens, activations = self.annotator.parse_activations(activation_file)
         self.assertEqual(len(tokens), 2)
         self.assertEqual(len(activations), 2)
         self.assertEqual(tokens, ["if", "while"])
         np.testing.assert_array_almost_equal(activations[0], [0.1, 0.2])
         np.testing.assert_array_almost_equal(activations[1], [0.3, 0.4])
 
+    def test_parse_activations_streaming(self):
+        activation_file = os.path.join(self.test_dir, "activations.json")
+        features = [{"token": "Ġif", "layers": [{"index": 0, "values": [0.1, -2.5]},
+                                                 {"index": 1, "values": [1e-05, 3.0]}]},
+                    {"token": "x", "layers": [{"index": 0, "values": [0.5, 0.25]},
+                                              {"index": 1, "values": [1.0, 2.0]}]}]
+        with open(activation_file, 'wb') as f:
+            f.write(orjson.dumps({"linex_index": 0, "features": features}))
+
+        tokens, activations = self.annotator.parse_activations(activation_file)
+        self.assertEqual(tokens, ["if", "x"])
+        self.assertEqual([index for index, _ in activations[0]], [0, 1])
+        self.assertEqual(activations[0][1][1].dtype, np.float32)
+        np.testing.assert_array_equal(activations[0][1][1], np.array([1e-05, 3.0], dtype=np.float32))
+
+        # ijson is optional; streaming must give the same arrays as the one-shot decode
+        if importlib.util.find_spec("ijson") is None:
+            self.skipTest("ijson is not installed")
+        self.annotator.stream_activations = True
+        streamed_tokens, streamed = self.annotator.parse_activations(activation_file)
+        self.assertEqual(streamed_tokens, tokens)
+        for token_layers, streamed_layers in zip(activations, streamed):
+            for (index, values), (streamed_index, streamed_values) in zip(token_layers, streamed_layers):
+                self.assertEqual(streamed_index, index)
+                np.testing.assert_array_equal(streamed_values, values)
+
     def test_aggregate_activation_list(self):
         # Simplified test case with exact values
         layer_activations = np.array([[0.1, 0.2]])
@@ -128,6 +201,78 @@ class TestActivationAnnotator(unittest.TestCase):
         expected_max = np.array([0.1, 0.2])
         np.testing.assert_array_almost_equal(result, expected_max)
 
+    def test_aggregate_phrase_activations(self):
+        tokens_with_depth = [("a", 2), ("b", 1), ("c", 2)]
+        activations = [
+            [(0, np.array([1.0, 2.0], dtype=np.float32)), (1, np.array([0.0, 4.0], dtype=np.float32))],
+            [(0, np.array([5.0, 5.0], dtype=np.float32)), (1, np.array([1.0, 1.0], dtype=np.float32))],
+            [(0, np.array([3.0, 4.0], dtype=np.float32)), (1, np.array([2.0, 0.0], dtype=np.float32))],
+        ]
+
+        result = self.annotator.aggregate_phrase_activations(tokens_with_depth, activations, method="mean")
+        self.assertEqual([feature["phrase"] for feature in result["features"]], ["b", "a c"])
+        layers = result["features"][1]["layers"]
+        self.assertEqual([layer["index"] for layer in layers], [0, 1])
+        np.testing.assert_array_equal(layers[0]["values"], [2.0, 3.0])
+        np.testing.assert_array_equal(layers[1]["values"], [1.0, 2.0])
+
+        self.annotator.binary_output = True
+        self.annotator.write_phrase_activations(result, self.test_dir)
+        with np.load(os.path.join(self.test_dir, "test_phrasal_activations.npz")) as archive:
+            self.assertEqual(archive["phrases"].tolist(), ["b", "a c"])
+            self.assertEqual(archive["layer_indices"].tolist(), [0, 1])
+            np.testing.assert_array_equal(archive["activations"][1], [[2.0, 3.0], [1.0, 2.0]])
+
+        # Tokens with differing layers are grouped by layer index instead
+        activations[1] = activations[1][1:]
+        result = self.annotator.aggregate_phrase_activations(tokens_with_depth, activations, method="max")
+        self.assertEqual([layer["index"] for layer in result["features"][0]["layers"]], [1])
+        np.testing.assert_array_equal(result["features"][0]["layers"][0]["values"], [1.0, 1.0])
+        np.testing.assert_array_equal(result["features"][1]["layers"][0]["values"], [3.0, 4.0])
+
+    def test_generate_activations_reuses_model(self):
+        def get_model_and_tokenizer(model_desc, device="cpu", random_weights=False):
+            return "model", "tokenizer"
+
+        loader = Mock(side_effect=get_model_and_tokenizer)
+        random_weights = []
+
+        def extract_representations(model_desc, input_file, output_file, **kwargs):
+            # NeuroX looks its loader up on the module for every extraction
+            extractor.get_model_and_tokenizer(model_desc, device=kwargs["device"],
+                                              random_weights=random_weights[-1])
+
+        # A stand-in for NeuroX's module, so the test runs without NeuroX installed
+        extractor = SimpleNamespace(get_model_and_tokenizer=loader,
+                                    extract_representations=extract_representations)
+        for cached in (ast_token_activator._load_model, ast_token_activator._neurox_load_model):
+            cached.cache_clear()
+            self.addCleanup(cached.cache_clear)
+        with patch.object(ast_token_activator, "_transformers_extractor", Mock(return_value=extractor)):
+            random_weights.append(False)
+            self.annotator.generate_activations("in.txt", "out.json")
+            self.annotator.generate_activations("in.txt", "out.json")
+            self.assertEqual(loader.call_count, 1)
+
+            # Random weights are drawn anew for every extraction
+            random_weights.append(True)
+            self.annotator.generate_activations("in.txt", "out.json")
+            self.annotator.generate_activations("in.txt", "out.json")
+            self.assertEqual(loader.call_count, 3)
+        self.assertIs(extractor.get_model_and_tokenizer, loader)
+        loader.assert_called_with("bert-base-uncased", device="cpu", random_weights=True)
+
+    def test_unsupported_dtype(self):
+        with self.assertRaises(ValueError):
+            ActivationAnnotator(model_name="bert-base-uncased", dtype="int8")
+
+    def test_import_defers_neurox(self):
+        # NeuroX pulls in torch and transformers, so it is only imported to extract activations
+        code = "import sys, raid.ast_token_activator; sys.exit('neurox' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code],
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.returncode, 0)
+
     def test_handle_binary_filter(self):
         # Create instance method for handle_binary_filter
         def handle_binary_filter(self, tokens):
@@ -145,22 +290,116 @@ class TestActivationAnnotator(unittest.TestCase):
             else:
                 raise ValueError(f"Invalid binary filter type: {filter_type}")
 
-        # Monkey patch the method
-        ActivationAnnotator.handle_binary_filter = handle_binary_filter
+        # Patch the method for this test only, so later tests see the real one
+        with patch.object(ActivationAnnotator, 'handle_binary_filter', handle_binary_filter):
+            tokens = ["if", "while", "for", "else", "print"]
+            
+            # Test regex filter
+            self.annotator.binary_filter = "re:^(if|while|for)$"
+            binary_labels = self.annotator.handle_binary_filter(tokens)
+            expected = [1, 1, 1, 0, 0]
+            self.assertEqual(binary_labels, expected)
+
+            # Test set filter
+            self.annotator.binary_filter = "set:if,while"
+            binary_labels = self.annotator.handle_binary_filter(tokens)
+            expected = [1, 1, 0, 0, 0]
+            self.assertEqual(binary_labels, expected)
 
+    def test_binary_mask(self):
         tokens = ["if", "while", "for", "else", "print"]
-        
-        # Test regex filter
-        self.annotator.binary_filter = "re:^(if|while|for)$"
-        binary_labels = self.annotator.handle_binary_filter(tokens)
-        expected = [1, 1, 1, 0, 0]
-        self.assertEqual(binary_labels, expected)
-
-        # Test set filter
-        self.annotator.binary_filter = "set:if,while"
-        binary_labels = self.annotator.handle_binary_filter(tokens)
-        expected = [1, 1, 0, 0, 0]
-        self.assertEqual(binary_labels, expected)
+        mask = ActivationAnnotator._binary_mask(frozenset({"if", "while"}).__contains__, tokens)
+        self.assertEqual(mask.dtype, np.uint8)
+        np.testing.assert_array_equal(mask, [1, 1, 0, 0, 0])
+        self.assertEqual(ast_token_activator.BINARY_LABEL_NAMES[mask].tolist(),
+                         ["positive", "positive", "negative", "negative", "negative"])
+
+        mask = ActivationAnnotator._binary_mask(re.compile("^(if|while|for)$").match, tokens)
+        np.testing.assert_array_equal(mask, [1, 1, 1, 0, 0])
+        self.assertEqual(ActivationAnnotator._binary_mask(str.isupper, []).shape, (0,))
+
+    def test_binary_aggregated_activations(self):
+        tokens_with_depth = [("if", 1), ("while", 2)]
+        activations = [
+            [(0, np.array([0.1, 0.2], dtype=np.float32)), (1, np.array([0.3, 0.4], dtype=np.float32))],
+            [(0, np.array([0.5, 0.6], dtype=np.float32)), (1, np.array([0.7, 0.8], dtype=np.float32))]
+        ]
+        self.annotator.binary_output = True
+
+        self.annotator.write_aggregated_activations(tokens_with_depth, activations, self.test_dir)
+
+        aggregated = np.load(os.path.join(self.test_dir, "test_aggregated_activations.npy"), mmap_mode='r')
+        self.assertEqual(aggregated.dtype, np.float32)
+        np.testing.assert_array_almost_equal(aggregated, [[0.2, 0.3], [0.6, 0.7]])
+        with open(os.path.join(self.test_dir, "test_aggregated_tokens.json"), 'rb') as f:
+            sidecar = orjson.loads(f.read())
+        self.assertEqual(sidecar["tokens"], ["if", "while"])
+        self.assertEqual(sidecar["depths"], [1, 2])
+        del aggregated
+
+    def test_json_aggregated_activations(self):
+        tokens_with_depth = [("if", 1), ("while", 2)]
+        activations = [
+            [(0, np.array([0.5, 1.0], dtype=np.float32))],
+            [(0, np.array([0.25, 2.0], dtype=np.float32))]
+        ]
+
+        self.annotator.write_aggregated_activations(tokens_with_depth, activations, self.test_dir)
+
+        with open(os.path.join(self.test_dir, "test_aggregated_activations.json"), 'rb') as f:
+            data = orjson.loads(f.read())
+        self.assertEqual(data["aggregation_method"], "mean")
+        self.assertEqual(data["features"], [
+            {"token": "if", "aggregated_values": [0.5, 1.0]},
+            {"token": "while", "aggregated_values": [0.25, 2.0]}
+        ])
+
+    def test_annotate_data_activations(self):
+        tokens_with_depth = [("if", 1), ("x", 0)]
+        # parse_activations yields float32 arrays
+        activations = [
+            [(0, np.array([9.0, 9.0], dtype=np.float32)), (1, np.array([0.1, -2.5], dtype=np.float32))],
+            [(0, np.array([9.0, 9.0], dtype=np.float32)), (1, np.array([1e-05, 3.0], dtype=np.float32))]
+        ]
+
+        self.annotator.annotate_data(tokens_with_depth, activations, self.test_dir)
+        with open(os.path.join(self.test_dir, "test_activations.txt"), encoding='utf-8') as f:
+            self.assertEqual(f.read(), "0.100000001 -2.5\n9.99999975e-06 3\n")
+        written = np.loadtxt(os.path.join(self.test_dir, "test_activations.txt"), dtype=np.float32)
+        np.testing.assert_array_equal(written, np.array([[0.1, -2.5], [1e-05, 3.0]], dtype=np.float32))
+
+        self.annotator.binary_output = True
+        self.annotator.annotate_data(tokens_with_depth, activations, self.test_dir)
+        last_layer = np.load(os.path.join(self.test_dir, "test_activations.npy"))
+        self.assertEqual(last_layer.dtype, np.float32)
+        np.testing.assert_array_equal(last_layer, np.array([[0.1, -2.5], [1e-05, 3.0]], dtype=np.float32))
+
+        self.annotator.quantize = True
+        self.annotator.annotate_data(tokens_with_depth, activations, self.test_dir)
+        with np.load(os.path.join(self.test_dir, "test_activations.npz")) as data:
+            self.assertEqual(data["q"].dtype, np.int8)
+            self.assertEqual(data["scale"].shape, (1, 2))
+            np.testing.assert_array_equal(data["q"], [[127, -106], [0, 127]])
+            np.testing.assert_array_almost_equal(data["q"] * data["scale"], [[0.1, -2.5], [0.0, 3.0]], decimal=2)
+
+    def test_compile_binary_filter(self):
+        tokens = [("if", 1), ("while", 2), ("else", 1)]
+        activations = [[(0, np.zeros(2))]] * 3
+
+        regex = ActivationAnnotator._compile_binary_filter("re:^(if|while|for)$")
+        word_set = ActivationAnnotator._compile_binary_filter("set:if,else")
+        self.assertIsInstance(word_set, frozenset)
+        self.assertIs(ActivationAnnotator._compile_binary_filter("set:if,else"), word_set)
+
+        mask = ActivationAnnotator._binary_mask(regex.match, [token for token, _ in tokens])
+        np.testing.assert_array_equal(mask, np.array([1, 1, 0], dtype=np.uint8))
+        _, labels, _ = self.annotator._create_binary_data(tokens, activations, regex)
+        self.assertEqual(labels, ['positive', 'positive', 'negative'])
+        _, labels, _ = self.annotator._create_binary_data(tokens, activations, word_set)
+        self.assertEqual(labels, ['positive', 'negative', 'positive'])
+
+        with self.assertRaises(ValueError):
+            ActivationAnnotator._compile_binary_filter("invalid:pattern")
 
     def test_write_aggregated_activations(self):
         # Simplified test case
@@ -177,25 +416,35 @@ class TestActivationAnnotator(unittest.TestCase):
             output_data = {
                 "aggregation_method": self.aggregation_method,
                 "features": [
-                    {"token": token, "aggregated_values": acts[0][1].tolist()}
+                    {"token": token, "aggregated_values": acts[0][1]}
                     for (token, _), acts in zip(tokens_with_depth, activations)
                 ]
             }
-            with open(os.path.join(output_dir, f"{self.output_prefix}_aggregated.json"), 'w') as f:
-                json.dump(output_data, f)
+            with open(os.path.join(output_dir, f"{self.output_prefix}_aggregated.json"), 'wb') as f:
+                f.write(orjson.dumps(output_data, option=orjson.OPT_SERIALIZE_NUMPY))
 
-        # Monkey patch the method
-        ActivationAnnotator.write_aggregated_activations = write_aggregated_activations
-        
-        self.annotator.write_aggregated_activations(tokens_with_depth, activations, self.test_dir)
+        # Patch the method for this test only, so later tests see the real one
+        with patch.object(ActivationAnnotator, 'write_aggregated_activations', write_aggregated_activations):
+            self.annotator.write_aggregated_activations(tokens_with_depth, activations, self.test_dir)
 
         self.assertTrue(os.path.exists(output_file))
-        with open(output_file) as f:
-            data = json.load(f)
+        with open(output_file, 'rb') as f:
+            data = orjson.loads(f.read())
             self.assertIn("aggregation_method", data)
             self.assertIn("features", data)
             self.assertEqual(len(data["features"]), 2)
 
+    def test_quantize_int8(self):
+        activations = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]])
+
+        quantized, scale = ActivationAnnotator._quantize_int8(activations)
+
+        self.assertEqual(quantized.dtype, np.int8)
+        self.assertEqual(scale.shape, (2, 1))
+        np.testing.assert_array_equal(quantized[0], [64, -127, 32])
+        np.testing.assert_array_equal(quantized[1], [0, 0, 0])
+        np.testing.assert_array_almost_equal(quantized * scale, activations, decimal=2)
+
     def test_invalid_aggregation_method(self):
         # Create a simplified version that just checks the method name
         def aggregate_activation_list(self, activations):
@@ -203,21 +452,26 @@ class TestActivationAnnotator(unittest.TestCase):
                 raise ValueError(f"Invalid aggregation method: {self.aggregation_method}")
             return np.mean(activations, axis=0)
 
-        # Monkey patch the method
-        ActivationAnnotator.aggregate_activation_list = aggregate_activation_list
-        
-        self.annotator.aggregation_method = "invalid"
-        activations = np.array([[0.1, 0.2]])
-        
-        with self.assertRaises(ValueError):
-            self.annotator.aggregate_activation_list(activations)
+        # Patch the method for this test only, so later tests see the real one
+        with patch.object(ActivationAnnotator, 'aggregate_activation_list', aggregate_activation_list):
+            self.annotator.aggregation_method = "invalid"
+            activations = np.array([[0.1, 0.2]])
+            
+            with self.assertRaises(ValueError):
+                self.annotator.aggregate_activation_list(activations)
 
     def test_invalid_binary_filter(self):
-        tokens = ["if"]
         self.annotator.binary_filter = "invalid:pattern"
         
         with self.assertRaises(ValueError):
-            self.annotator.handle_binary_filter(tokens)
+            self.annotator.handle_binary_filter()
+
+        # An invalid filter only fails once tokens are labeled, not at construction
+        annotator = ActivationAnnotator(model_name="bert-base-uncased", binary_filter="invalid:pattern",
+                                        output_prefix=os.path.join(self.test_dir, "invalid"))
+        self.assertIsNone(annotator.binary_filter_compiled)
+        with self.assertRaises(ValueError):
+            annotator.annotate_data([("if", 1)], [[(0, np.zeros(2))]], self.test_dir)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Content-addressed cache for artifacts derived from parsed source code.
+
+Tree-sitter trees cannot be serialized, so instead of the trees themselves this module stores
+whatever is derived from them (token lists, labels, ...), keyed by the SHA-256 of the source
+bytes together with a namespace describing the artifact and the grammar that produced it.
+"""
+
+import hashlib
+import marshal
+import sqlite3
+from importlib import metadata
+from typing import Any, Optional
+
+# Seconds a connection waits for another process's write to finish before giving up
+BUSY_TIMEOUT = 60.0
+
+# Version of the cached artifacts, part of every key. Bump it whenever RAID's own token or
+# label logic changes what is derived from a source, so results of older code miss the cache.
+CACHE_FORMAT_VERSION = 1
+
+
+def grammar_version(package: str) -> str:
+    """
+    Return the installed version of a tree-sitter grammar package.
+
+    Args:
+        package: Distribution name of the grammar (e.g. 'tree-sitter-java')
+
+    Returns:
+        The package version, or 'unknown' if it cannot be determined
+    """
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+class ASTCache:
+    """
+    SQLite-backed store of AST-derived artifacts keyed by source content.
+
+    Artifacts are plain values (str, int, float, bytes, and lists, tuples and dicts of them)
+    stored with marshal, so loading an entry builds data and never runs code, unlike pickle.
+
+    Attributes:
+        db_path (str): Path to the SQLite database file
+        connection (sqlite3.Connection): Open connection to the database
+    """
+
+    # Sources are usually looked up and then stored under several namespaces in a row, so the
+    # digest of the last source seen is kept to hash each source only once
+    _last_source = None
+    _last_source_digest = None
+
+    def __init__(self, db_path: str):
+        """
+        Open (creating if needed) the cache database.
+
+        Several processes may share the database, as the pipeline's workers do. It is put in
+        WAL mode, so readers never wait for a writer, and writers wait up to BUSY_TIMEOUT
+        for each other instead of failing with "database is locked".
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS ast_cache (key BLOB PRIMARY KEY, value BLOB NOT NULL)"
+            )
+
+    def make_key(self, namespace: str, source: bytes) -> bytes:
+        """
+        Build the cache key for a source under a namespace.
+
+        Args:
+            namespace: Name of the cached artifact, including the grammar version
+            source: Raw source code bytes
+
+        Returns:
+            SHA-256 digest of CACHE_FORMAT_VERSION, the namespace and the SHA-256 digest of
+            the source
+        """
+        if source is not self._last_source:
+            self._last_source_digest = hashlib.sha256(source).digest()
+            self._last_source = source
+        digest = hashlib.sha256(f"v{CACHE_FORMAT_VERSION}:{namespace}".encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(self._last_source_digest)
+        return digest.digest()
+
+    def get(self, namespace: str, source: bytes) -> Optional[Any]:
+        """
+        Look up a cached artifact.
+
+        Args:
+            namespace: Name of the cached artifact, including the grammar version
+            source: Raw source code bytes
+
+        Returns:
+            The cached artifact, or None on a miss
+        """
+        row = self.connection.execute(
+            "SELECT value FROM ast_cache WHERE key = ?", (self.make_key(namespace, source),)
+        ).fetchone()
+        return None if row is None else marshal.loads(row[0])
+
+    def put(self, namespace: str, source: bytes, value: Any) -> None:
+        """
+        Store an artifact, replacing any previous entry for the same source.
+
+        Args:
+            namespace: Name of the cached artifact, including the grammar version
+            source: Raw source code bytes
+            value: Artifact derived from the source, made of plain values only
+
+        Raises:
+            ValueError: If value holds anything other than plain values
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO ast_cache (key, value) VALUES (?, ?)",
+                (self.make_key(namespace, source), marshal.dumps(value))
+            )
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self.connection.close()
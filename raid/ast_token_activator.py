@@ -10,18 +10,185 @@ manipulation and ActivationAnnotator for neural activation analysis.
 import os
 import sys
 import argparse
+import contextlib
+import functools
+import inspect
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import re
-import json
+import orjson
 from typing import Pattern, List, Tuple, Dict, Any, Union
 
 from tree_sitter import Parser, Language
 import tree_sitter_java as tsjava
-import neurox.data.extraction.transformers_extractor as transformers_extractor
+
+from .ast_cache import ASTCache, grammar_version
+from .ast_utils import nodes_at_level
 
 # Initialize the Java language
 JAVA_LANGUAGE = Language(tsjava.language())
 
+# Parsers are reused per thread rather than created per processor
+_PARSER_LOCAL = threading.local()
+
+# Number of tokens joined per write when writing input_sentences.txt
+TOKEN_WRITE_CHUNK = 4096
+
+# Label names indexed by the binary filter result (0 = negative, 1 = positive)
+BINARY_LABEL_NAMES = np.array(['negative', 'positive'])
+
+# Cache namespace of leaf tokens, tied to the grammar that produced them
+LEAF_TOKENS_CACHE_NAMESPACE = f"java-leaf-tokens:{grammar_version('tree-sitter-java')}"
+
+
+@functools.lru_cache(maxsize=None)
+def _transformers_extractor() -> Any:
+    """
+    Import NeuroX's transformers extractor on first use.
+    
+    Importing it loads torch and transformers, which tokenization, labeling and the
+    command line help do not need.
+    
+    Returns:
+        The neurox.data.extraction.transformers_extractor module
+    """
+    import neurox.data.extraction.transformers_extractor as transformers_extractor
+
+    return transformers_extractor
+
+
+@functools.lru_cache(maxsize=None)
+def _neurox_load_model() -> Any:
+    """
+    Return NeuroX's own model loader, which _load_model wraps.
+    
+    The loader is looked up before generate_activations first replaces it, and cached.
+    
+    Returns:
+        NeuroX's get_model_and_tokenizer, or None if this NeuroX version has no such hook
+        or it cannot be called as get_model_and_tokenizer(model_desc, device=, random_weights=)
+    """
+    loader = getattr(_transformers_extractor(), 'get_model_and_tokenizer', None)
+    if loader is None:
+        return None
+    try:
+        inspect.signature(loader).bind('model', device='cpu', random_weights=False)
+    except (TypeError, ValueError):
+        return None
+    return loader
+
+# Serializes the temporary swap of NeuroX's loader in ActivationAnnotator.generate_activations
+_MODEL_LOADER_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=2)
+def _load_model(model_desc: str, device: str = 'cpu', random_weights: bool = False,
+                compile_model: bool = False) -> Tuple[Any, Any]:
+    """
+    Load a transformer model and its tokenizer through NeuroX, once per process.
+    
+    Args:
+        model_desc: Model name, as accepted by NeuroX
+        device: Device the model is placed on
+        random_weights: Whether NeuroX should randomly initialize the weights
+        compile_model: Wrap the model with torch.compile. Shapes are marked dynamic
+                       since every sentence has its own length.
+        
+    Returns:
+        Tuple of (model, tokenizer)
+    """
+    model, tokenizer = _neurox_load_model()(model_desc, device=device, random_weights=random_weights)
+    if compile_model:
+        import torch
+
+        model = torch.compile(model, dynamic=True)
+    return model, tokenizer
+
+
+def _reuse_model(model_desc: str, device: str = 'cpu', random_weights: bool = False,
+                 compile_model: bool = False) -> Tuple[Any, Any]:
+    """
+    Stand-in for NeuroX's get_model_and_tokenizer that reuses models loaded by _load_model.
+    
+    Models with random weights are loaded anew on every call, so each extraction still
+    draws fresh weights.
+    
+    Args:
+        model_desc: Model name, as accepted by NeuroX
+        device: Device the model is placed on
+        random_weights: Whether NeuroX should randomly initialize the weights
+        compile_model: Wrap the model with torch.compile
+        
+    Returns:
+        Tuple of (model, tokenizer)
+    """
+    if random_weights:
+        return _load_model.__wrapped__(model_desc, device, True, compile_model)
+    return _load_model(model_desc, device, False, compile_model)
+
+
+# Reduced-precision dtypes accepted by ActivationAnnotator, by torch dtype name
+INFERENCE_DTYPES = {'fp32': None, 'bf16': 'bfloat16', 'fp16': 'float16'}
+
+
+def _inference_context(device: str, dtype: str) -> contextlib.AbstractContextManager:
+    """
+    Return the context transformer inference runs in for the requested precision.
+    
+    Reduced precision uses autocast rather than casting the model: matrix products run
+    in bf16/fp16 while normalization layers, and so the hidden states NeuroX converts
+    to numpy, stay float32.
+    
+    Args:
+        device: Device the model runs on ('cpu' or 'cuda')
+        dtype: One of INFERENCE_DTYPES
+        
+    Returns:
+        A context manager enabling inference mode and autocast, or a no-op for fp32
+    """
+    if INFERENCE_DTYPES[dtype] is None:
+        return contextlib.nullcontext()
+    import torch
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    stack.enter_context(torch.autocast(device_type=device.split(':')[0],
+                                       dtype=getattr(torch, INFERENCE_DTYPES[dtype])))
+    return stack
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_device(device: str) -> str:
+    """
+    Resolve the 'auto' device to CUDA when it is available, and to the CPU otherwise.
+    
+    Args:
+        device: Device name ('auto', 'cpu', 'cuda', ...)
+        
+    Returns:
+        The device name to run the model on
+    """
+    if device != 'auto':
+        return device
+    import torch
+
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def _java_parser() -> Parser:
+    """
+    Return the Java parser of the calling thread, creating it on first use.
+    
+    Returns:
+        tree_sitter.Parser: Parser for JAVA_LANGUAGE owned by the current thread
+    """
+    parser = getattr(_PARSER_LOCAL, 'parser', None)
+    if parser is None:
+        parser = _PARSER_LOCAL.parser = Parser(JAVA_LANGUAGE)
+    return parser
+
 class JavaASTProcessor:
     """
     Process Java source code to extract Abstract Syntax Tree (AST) information.
@@ -32,30 +199,63 @@ class JavaASTProcessor:
     Attributes:
         java_file_path (str): Path to the Java source file
         output_dir (str): Directory where output files will be saved
-        source_code (str): Content of the Java source file
+        source_bytes (bytes): Raw UTF-8 content of the Java source file, as parsed
         tree (tree_sitter.Tree): Parsed AST
         root_node (tree_sitter.Node): Root node of the AST
         tokens_tuples (List[Tuple[str, str, int]]): List of (token_type, token_text, depth) tuples
         tokens (List[str]): List of extracted token texts
-        parser (tree_sitter.Parser): Tree-sitter parser instance
+        parser (tree_sitter.Parser): Tree-sitter parser of the thread that created the processor
+        cache (ASTCache, optional): Cache of leaf tokens keyed by source content
+        verbose (bool): Whether every extracted token is printed when the tokens are written
     """
 
-    def __init__(self, java_file_path: str, output_dir: str):
+    def __init__(self, java_file_path: str, output_dir: str, cache: ASTCache = None,
+                 verbose: bool = False):
         """
         Initialize the JavaASTProcessor with file path and output directory.
         
         Args:
             java_file_path: Path to the Java source file
             output_dir: Directory where output files will be saved
+            cache (ASTCache, optional): Cache of leaf tokens keyed by source content.
+                                        If None, every file is parsed.
+            verbose: Print the type, text and depth of every token when writing them
         """
         self.java_file_path = java_file_path
         self.output_dir = output_dir
-        self.source_code = None
+        self.source_bytes = None
         self.tree = None
         self.root_node = None
         self.tokens_tuples = None
         self.tokens = None
-        self.parser = Parser(JAVA_LANGUAGE)
+        self.parser = _java_parser()
+        self.cache = cache
+        self.verbose = verbose
+
+    @classmethod
+    def batch_process(cls, java_file_paths: List[str], output_dir: str,
+                      max_workers: int = None) -> List['JavaASTProcessor']:
+        """
+        Extract the tokens of several Java files concurrently.
+        
+        Each worker thread reuses its own parser. Tokens are not written to the output
+        directory and no cache is used, since an ASTCache connection belongs to one thread.
+        
+        Args:
+            java_file_paths: Paths to the Java source files
+            output_dir: Directory stored on each processor for later writes
+            max_workers (int, optional): Number of threads (ThreadPoolExecutor default if None)
+            
+        Returns:
+            List of processors with tokens extracted, in the order of java_file_paths
+        """
+        def extract(java_file_path):
+            processor = cls(java_file_path, output_dir)
+            processor.extract_tokens()
+            return processor
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(extract, java_file_paths))
 
     def process_ast(self) -> None:
         """
@@ -66,23 +266,44 @@ class JavaASTProcessor:
         2. Parses it into an AST
         3. Extracts tokens
         4. Writes tokens to output file
+        
+        When a cache is set and already holds the tokens of this exact source, steps 2
+        and 3 are skipped (self.tree and self.root_node are then left unset).
+        """
+        self.extract_tokens()
+        self.write_tokens_to_file()
+
+    def extract_tokens(self) -> None:
+        """
+        Read, parse and extract the tokens of the Java source file without writing them.
+        
+        Fills self.tokens_tuples and self.tokens, taking them from the cache when possible.
         """
         self.read_source_code()
-        self.parse_source_code()
-        self.tokens_tuples = self.extract_leaf_tokens()
+        cached_tokens = None
+        if self.cache is not None:
+            cached_tokens = self.cache.get(LEAF_TOKENS_CACHE_NAMESPACE, self.source_bytes)
+        if cached_tokens is None:
+            self.parse_source_code()
+            self.tokens_tuples = self.extract_leaf_tokens()
+            if self.cache is not None:
+                self.cache.put(LEAF_TOKENS_CACHE_NAMESPACE, self.source_bytes, self.tokens_tuples)
+        else:
+            self.tokens_tuples = cached_tokens
         self.tokens = [token_text for _, token_text, _ in self.tokens_tuples]
-        self.write_tokens_to_file()
 
     def read_source_code(self) -> None:
         """
         Read and store the Java source code from the file.
         
+        The raw bytes are kept and handed to tree-sitter as-is. The source is never
+        decoded, since nothing here needs it as text.
+        
         Raises:
             FileNotFoundError: If the Java file doesn't exist
-            UnicodeDecodeError: If the file encoding is not UTF-8
         """
-        with open(self.java_file_path, 'r', encoding='utf-8') as file:
-            self.source_code = file.read()
+        with open(self.java_file_path, 'rb') as file:
+            self.source_bytes = file.read()
 
     def parse_source_code(self) -> None:
         """
@@ -90,12 +311,15 @@ class JavaASTProcessor:
         
         The parsed tree is stored in self.tree and the root node in self.root_node.
         """
-        self.tree = self.parser.parse(self.source_code.encode('utf-8'))
+        self.tree = self.parser.parse(self.source_bytes)
         self.root_node = self.tree.root_node
 
     def extract_leaf_tokens(self, node=None, depth: int = 0) -> List[Tuple[str, str, int]]:
         """
-        Recursively extract tokens from AST leaf nodes.
+        Extract tokens from AST leaf nodes.
+        
+        The leaves are collected with a TreeCursor walk rather than recursion, and their
+        text is sliced straight out of self.source_bytes.
         
         Args:
             node: Current AST node (defaults to root node if None)
@@ -106,31 +330,35 @@ class JavaASTProcessor:
         """
         if node is None:
             node = self.root_node
-        tokens = []
-        if len(node.children) == 0:
-            tokens.append((node.type, node.text.decode('utf-8'), depth))
-        else:
-            for child in node.children:
-                tokens.extend(self.extract_leaf_tokens(child, depth + 1))
-        return tokens
+        leaves, levels = nodes_at_level(node, -1)
+        source = self.source_bytes
+        return [(leaf.type, source[leaf.start_byte:leaf.end_byte].decode('utf-8'), depth + level)
+                for leaf, level in zip(leaves, levels)]
 
     def write_tokens_to_file(self) -> None:
         """
         Write extracted tokens to a file in the output directory.
         
-        Creates 'input_sentences.txt' in the output directory and prints token information
-        to the console.
+        Creates 'input_sentences.txt' in the output directory, written in chunks of tokens
+        rather than as one joined string, and prints token information to the console when
+        verbose is set.
         
         Raises:
             IOError: If unable to write to the output directory
         """
         input_file = os.path.join(self.output_dir, 'input_sentences.txt')
-        with open(input_file, 'w', encoding='utf-8') as f:
-            f.write(' '.join(self.tokens) + '\n')
+        tokens = self.tokens
+        with open(input_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            for start in range(0, len(tokens), TOKEN_WRITE_CHUNK):
+                if start:
+                    f.write(' ')
+                f.write(' '.join(tokens[start:start + TOKEN_WRITE_CHUNK]))
+            f.write('\n')
         print(f"Tokens written to '{input_file}'.")
-        print("Extracted Tokens:")
-        for token_type, token_text, depth in self.tokens_tuples:
-            print(f"Type: {token_type}, Text: {token_text}, Depth: {depth}")
+        if self.verbose:
+            print("Extracted Tokens:")
+            sys.stdout.writelines(f"Type: {token_type}, Text: {token_text}, Depth: {depth}\n"
+                                  for token_type, token_text, depth in self.tokens_tuples)
 
 
 class ActivationAnnotator:
@@ -142,39 +370,77 @@ class ActivationAnnotator:
     
     Attributes:
         model_name (str): Name of the transformer model to use
-        device (str): Computing device ('cpu' or 'cuda')
+        device (str): Computing device ('cpu' or 'cuda'), with 'auto' already resolved
         binary_filter (str): Filter specification for binary classification
         output_prefix (str): Prefix for output files
-        binary_filter_compiled (Union[Pattern, set]): Compiled filter
+        binary_filter_compiled (Union[Pattern, frozenset], optional): Compiled filter, or None
+                               until the filter is first used
         aggregation_method (str): Method for aggregating activations
         layer (int, optional): Specific transformer layer to extract.
                              If None, extracts all layers.
+        quantize (bool): Whether aggregated and last-layer activations are stored as int8 (.npz)
+        binary_output (bool): Whether aggregated and last-layer activations are stored as
+                         float32 (.npy) and phrase activations as float32 (.npz) instead of text
+        dtype (str): Precision of transformer inference ('fp32', 'bf16' or 'fp16')
+        compile_model (bool): Whether the transformer is wrapped with torch.compile
+        stream_activations (bool): Whether the activation JSON is streamed with ijson
+                                   instead of decoded at once with orjson
     """
 
     def __init__(self, model_name: str, device: str = 'cpu', 
                  binary_filter: str = 'set:public,static', 
                  output_prefix: str = 'output',
                  aggregation_method: str = 'mean',
-                 layer: int = None):
+                 layer: int = None,
+                 quantize: bool = False,
+                 binary_output: bool = False,
+                 dtype: str = 'fp32',
+                 compile_model: bool = False,
+                 stream_activations: bool = False):
         """
         Initialize the ActivationAnnotator.
         
         Args:
             model_name: Name of the transformer model
-            device: Computing device ('cpu' or 'cuda')
+            device: Computing device ('cpu' or 'cuda'), or 'auto' to use CUDA when available
             binary_filter: Filter specification (starts with 're:' for regex or 'set:' for word set)
             output_prefix: Prefix for output files
             aggregation_method: Method for aggregating activations ('mean', 'max', 'sum', 'concat')
             layer (int, optional): Specific transformer layer to extract.
                                  If None, extracts all layers.
+            quantize: Store aggregated activations as int8 with per-token scales and
+                      last-layer activations as int8 with per-channel scales (.npz)
+            binary_output: Store aggregated activations as a float32 .npy array with a
+                           JSON sidecar of tokens and depths, phrase activations as a
+                           float32 .npz archive and last-layer activations as a float32
+                           .npy array. Aggregated and last-layer activations are
+                           quantized instead when quantize is set.
+            dtype: Precision of transformer inference ('fp32', 'bf16' or 'fp16'); reduced
+                   precisions run the model under autocast
+            compile_model: Wrap the transformer with torch.compile; compilation happens
+                           on the first extraction and pays off for large inputs
+            stream_activations: Stream the activation JSON with ijson, which must be
+                                installed; lowers peak memory on large files at about
+                                twice the parse time
+                   
+        Raises:
+            ValueError: If dtype is not a supported precision
         """
+        if dtype not in INFERENCE_DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}', expected one of {', '.join(INFERENCE_DTYPES)}")
         self.model_name = model_name
-        self.device = device
+        self.device = _resolve_device(device)
         self.binary_filter = binary_filter
         self.output_prefix = output_prefix
-        self.binary_filter_compiled = re.compile(binary_filter)
+        # Compiled on first use, so a filter that is never applied is never validated
+        self.binary_filter_compiled = None
         self.aggregation_method = aggregation_method
         self.layer = layer
+        self.quantize = quantize
+        self.binary_output = binary_output
+        self.dtype = dtype
+        self.compile_model = compile_model
+        self.stream_activations = stream_activations
 
     def process_activations(self, tokens_tuples: List[Tuple[str, str, int]], 
                             output_dir: str) -> None:
@@ -219,7 +485,6 @@ class ActivationAnnotator:
 
         # Parse and process the activations
         extracted_tokens, activations = self.parse_activations(output_file)
-        self.handle_binary_filter()
 
         # Tokens with depth information
         tokens_with_depth = [(t, d) for (_, t, d) in tokens_tuples]
@@ -238,6 +503,10 @@ class ActivationAnnotator:
         """
         Generate neural network activations using the specified transformer model.
         
+        The model and tokenizer are loaded once per process and reused by later calls.
+        With a bf16 or fp16 dtype the model runs under torch autocast in inference mode.
+        NeuroX reads the hidden states of every layer, so the model still returns all of them.
+        
         Args:
             input_file: Path to input file containing tokens
             output_file: Path where activations will be saved
@@ -261,18 +530,44 @@ class ActivationAnnotator:
             })
         # If no layer is specified, we do not decompose by layer, producing a single activations.json file.
         
-        transformers_extractor.extract_representations(
-            self.model_name,
-            input_file,
-            output_file,
-            **extract_args
-        )
+        transformers_extractor = _transformers_extractor()
+        neurox_load_model = _neurox_load_model()
+        if neurox_load_model is None:
+            with _inference_context(self.device, self.dtype):
+                transformers_extractor.extract_representations(
+                    self.model_name,
+                    input_file,
+                    output_file,
+                    **extract_args
+                )
+            return
+
+        # NeuroX loads the model on every call; while extracting, its loader is replaced by
+        # _reuse_model so repeated runs in one process reuse the loaded model. This relies on
+        # extract_representations looking get_model_and_tokenizer up on its module at call time.
+        with _MODEL_LOADER_LOCK, _inference_context(self.device, self.dtype):
+            transformers_extractor.get_model_and_tokenizer = functools.partial(
+                _reuse_model, compile_model=self.compile_model)
+            try:
+                transformers_extractor.extract_representations(
+                    self.model_name,
+                    input_file,
+                    output_file,
+                    **extract_args
+                )
+            finally:
+                transformers_extractor.get_model_and_tokenizer = neurox_load_model
 
 
     def parse_activations(self, activation_file: str) -> Tuple[List[str], List[List[Tuple[int, np.ndarray]]]]:
         """
         Parse activations from the JSON output file.
         
+        By default the file is decoded in one orjson call, the fastest option. With
+        stream_activations set, features are streamed one at a time with ijson instead, so
+        only their float32 arrays are kept rather than the whole document as Python objects;
+        this lowers peak memory on large files but takes about twice as long.
+        
         Args:
             activation_file: Path to the activation JSON file
             
@@ -284,21 +579,27 @@ class ActivationAnnotator:
         Raises:
             FileNotFoundError: If activation file doesn't exist
             JSONDecodeError: If activation file is not valid JSON
+            ImportError: If stream_activations is set and ijson is not installed
         """
-        with open(activation_file, 'r', encoding='utf-8') as f:
-            activation_data = json.load(f)
         activations = []
         extracted_tokens = []
-        for feature in activation_data['features']:
-            token = feature['token'].replace('Ġ', '')
-            layers = feature['layers']
-            token_activations = []
-            for layer in layers:
-                layer_index = layer['index']
-                layer_values = layer['values']
-                token_activations.append((layer_index, np.array(layer_values)))
-            activations.append(token_activations)
-            extracted_tokens.append(token)
+        with open(activation_file, 'rb') as f:
+            if self.stream_activations:
+                import ijson
+
+                features = ijson.items(f, 'features.item', use_float=True)
+            else:
+                features = orjson.loads(f.read())['features']
+            for feature in features:
+                token = feature['token'].replace('Ġ', '')
+                layers = feature['layers']
+                token_activations = []
+                for layer in layers:
+                    layer_index = layer['index']
+                    layer_values = layer['values']
+                    token_activations.append((layer_index, np.array(layer_values, dtype=np.float32)))
+                activations.append(token_activations)
+                extracted_tokens.append(token)
         return extracted_tokens, activations
 
     def handle_binary_filter(self) -> None:
@@ -306,18 +607,39 @@ class ActivationAnnotator:
         Compile the binary filter based on user input.
         
         The filter can be either a regex pattern (prefixed with 're:')
-        or a set of words (prefixed with 'set:').
+        or a set of words (prefixed with 'set:'). annotate_data compiles the filter on
+        first use; call this again after changing binary_filter.
         
         Raises:
-            NotImplementedError: If filter prefix is neither 're:' nor 'set:'
+            ValueError: If filter prefix is neither 're:' nor 'set:'
             re.error: If regex pattern is invalid
         """
-        if self.binary_filter.startswith("re:"):
-            self.binary_filter_compiled = re.compile(self.binary_filter[3:])
-        elif self.binary_filter.startswith("set:"):
-            self.binary_filter_compiled = set(self.binary_filter[4:].split(","))
-        else:
-            raise NotImplementedError("Filter must start with 're:' for regex or 'set:' for a set of words.")
+        self.binary_filter_compiled = self._compile_binary_filter(self.binary_filter)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _compile_binary_filter(binary_filter: str) -> Union[Pattern, frozenset]:
+        """
+        Parse a filter specification into a compiled regex or a frozen word set.
+        
+        Results are immutable and cached, so annotators created for many files with the
+        same specification share one compiled filter.
+        
+        Args:
+            binary_filter: Filter specification ('re:<pattern>' or 'set:<word>,<word>,...')
+            
+        Returns:
+            Compiled regex pattern or frozenset of words
+            
+        Raises:
+            ValueError: If filter prefix is neither 're:' nor 'set:'
+            re.error: If regex pattern is invalid
+        """
+        if binary_filter.startswith("re:"):
+            return re.compile(binary_filter[3:])
+        if binary_filter.startswith("set:"):
+            return frozenset(binary_filter[4:].split(","))
+        raise ValueError("Filter must start with 're:' for regex or 'set:' for a set of words.")
 
     def annotate_data(self, tokens_with_depth: List[Tuple[str, int]], 
                      activations: List[List[Tuple[int, np.ndarray]]], 
@@ -325,6 +647,10 @@ class ActivationAnnotator:
         """
         Create binary data and save tokens and labels organized by AST depth.
         
+        The last-layer activation of every token is saved one row per token, as text,
+        with binary_output as a float32 .npy array, or with quantize as an .npz archive of
+        int8 values 'q' and per-channel float32 scales 'scale' (values ~= q * scale).
+        
         Args:
             tokens_with_depth: List of (token, depth) tuples
             activations: List of activations for each token
@@ -332,38 +658,48 @@ class ActivationAnnotator:
             
         Raises:
             IOError: If unable to write to output directory
+            ValueError: If binary_filter starts with neither 're:' nor 'set:'
         """
+        if self.binary_filter_compiled is None:
+            self.binary_filter_compiled = self._compile_binary_filter(self.binary_filter)
         tokens_depths, labels, flat_activations = self._create_binary_data(
             tokens_with_depth, activations, self.binary_filter_compiled, balance_data=False
         )
 
-        from collections import defaultdict
-        depth_to_tokens = defaultdict(list)
-        depth_to_labels = defaultdict(list)
-
+        # One bucket lookup per token; each bucket holds the tokens and labels of one depth
+        depth_buckets = {}
         for (token, depth), label in zip(tokens_depths, labels):
-            depth_to_tokens[depth].append(token)
-            depth_to_labels[depth].append(label)
+            bucket = depth_buckets.get(depth)
+            if bucket is None:
+                bucket = depth_buckets[depth] = ([], [])
+            bucket[0].append(token)
+            bucket[1].append(label)
 
-        max_depth = max(depth_to_tokens.keys())
+        # Line i of each file holds depth i, so depths without tokens still get an empty line
+        empty_bucket = ((), ())
+        buckets = [depth_buckets.get(depth, empty_bucket) for depth in range(max(depth_buckets, default=-1) + 1)]
 
         words_file = os.path.join(output_dir, f"{self.output_prefix}_tokens.txt")
         labels_file = os.path.join(output_dir, f"{self.output_prefix}_labels.txt")
-        activations_file = os.path.join(output_dir, f"{self.output_prefix}_activations.txt")
+        activations_file = os.path.join(output_dir, f"{self.output_prefix}_activations")
 
         with open(words_file, "w", encoding='utf-8') as f_words, \
              open(labels_file, "w", encoding='utf-8') as f_labels:
-            for depth in range(max_depth + 1):
-                tokens_line = ' '.join(depth_to_tokens.get(depth, []))
-                labels_line = ' '.join(depth_to_labels.get(depth, []))
-                f_words.write(tokens_line + '\n')
-                f_labels.write(labels_line + '\n')
-
-        with open(activations_file, 'w', encoding='utf-8') as f:
-            for token_activations in flat_activations:
-                last_layer_activation = token_activations[-1][1].tolist()
-                activation_str = ' '.join(map(str, last_layer_activation))
-                f.write(activation_str + '\n')
+            f_words.writelines([' '.join(bucket_tokens) + '\n' for bucket_tokens, _ in buckets])
+            f_labels.writelines([' '.join(bucket_labels) + '\n' for _, bucket_labels in buckets])
+
+        last_layers = [token_activations[-1][1] for token_activations in flat_activations]
+        last_layer = np.stack(last_layers) if last_layers else np.empty((0, 0))
+        if self.quantize:
+            # One scale per hidden unit: a unit's range is similar across tokens
+            quantized, scale = self._quantize_int8(last_layer, axis=0)
+            np.savez_compressed(activations_file + '.npz', q=quantized, scale=scale)
+        elif self.binary_output:
+            np.save(activations_file + '.npy', last_layer.astype(np.float32, copy=False))
+        else:
+            # One row per token, formatted in C; 9 significant digits round-trip float32,
+            # so values inexact in float32 show in full (0.1 is written as 0.100000001)
+            np.savetxt(activations_file + '.txt', last_layer, fmt='%.9g')
 
     def _create_binary_data(self, tokens_with_depth: List[Tuple[str, int]], 
                           activations: List[List[Tuple[int, np.ndarray]]], 
@@ -387,30 +723,38 @@ class ActivationAnnotator:
         Raises:
             NotImplementedError: If binary_filter is not a set, regex pattern, or callable
         """
-        if isinstance(binary_filter, set):
-            filter_fn = lambda x: x in binary_filter
+        if isinstance(binary_filter, (set, frozenset)):
+            filter_fn = binary_filter.__contains__
         elif isinstance(binary_filter, Pattern):
-            filter_fn = lambda x: binary_filter.match(x)
+            filter_fn = binary_filter.match
         elif callable(binary_filter):
             filter_fn = binary_filter
         else:
             raise NotImplementedError("The binary_filter must be a set, a regex pattern, or a callable function.")
 
-        words = []
-        depths = []
-        labels = []
-        final_activations = []
+        # Slices instead of re-zipping: the (token, depth) tuples are reused as they are
+        num_tokens = min(len(tokens_with_depth), len(activations))
+        words_depths = list(tokens_with_depth[:num_tokens])
+        mask = self._binary_mask(filter_fn, [token for token, _ in words_depths])
+        labels = BINARY_LABEL_NAMES[mask].tolist()
+        final_activations = list(activations[:num_tokens])
 
-        for (token, depth), token_activations in zip(tokens_with_depth, activations):
-            words.append(token)
-            depths.append(depth)
-            if filter_fn(token):
-                labels.append('positive')
-            else:
-                labels.append('negative')
-            final_activations.append(token_activations)
+        return words_depths, labels, final_activations
 
-        return list(zip(words, depths)), labels, final_activations
+    @staticmethod
+    def _binary_mask(filter_fn, tokens: List[str]) -> np.ndarray:
+        """
+        Evaluate a filter over tokens into a packed label array.
+        
+        Args:
+            filter_fn: Callable returning a truthy value for positive tokens
+            tokens: Tokens to label
+            
+        Returns:
+            numpy.ndarray: uint8 array with 1 for positive and 0 for negative tokens
+        """
+        return np.fromiter((1 if filter_fn(token) else 0 for token in tokens),
+                           dtype=np.uint8, count=len(tokens))
 
     def aggregate_activation_list(self, activations: List[np.ndarray], 
                                 method: str = 'mean') -> np.ndarray:
@@ -427,15 +771,34 @@ class ActivationAnnotator:
         Raises:
             ValueError: If unsupported aggregation method is specified
         """
-        activations_array = np.stack(activations)
+        return self._reduce_activations(np.stack(activations), method, axis=0)
+
+    @staticmethod
+    def _reduce_activations(activations_array: np.ndarray, method: str,
+                            axis: int = 0) -> np.ndarray:
+        """
+        Reduce an activation array along one axis using the specified method.
+        
+        Args:
+            activations_array: Array holding the activations to aggregate along `axis`
+            method: Aggregation method ('mean', 'max', 'sum', or 'concat')
+            axis: Axis to aggregate over; 'concat' merges it into the following axis
+            
+        Returns:
+            numpy.ndarray: Aggregated activation array
+            
+        Raises:
+            ValueError: If unsupported aggregation method is specified
+        """
         if method == 'mean':
-            return np.mean(activations_array, axis=0)
+            return activations_array.mean(axis=axis)
         elif method == 'max':
-            return np.max(activations_array, axis=0)
+            return activations_array.max(axis=axis)
         elif method == 'sum':
-            return np.sum(activations_array, axis=0)
+            return activations_array.sum(axis=axis)
         elif method == 'concat':
-            return np.concatenate(activations_array, axis=0)
+            shape = activations_array.shape
+            return activations_array.reshape(shape[:axis] + (-1,) + shape[axis + 2:])
         else:
             raise ValueError("Unsupported aggregation method")
 
@@ -460,40 +823,43 @@ class ActivationAnnotator:
         Raises:
             ValueError: If unsupported aggregation method is specified
         """
-        from collections import defaultdict
+        num_tokens = min(len(tokens_with_depth), len(activations))
+        by_layer, layer_indices = self._stack_by_layer(activations[:num_tokens])
 
-        depth_to_tokens = defaultdict(list)
-        depth_to_activations = defaultdict(list)
-        
-        for (token, depth), token_layers in zip(tokens_with_depth, activations):
-            depth_to_tokens[depth].append(token)
-            depth_to_activations[depth].append(token_layers)
+        # Group token positions by depth (in increasing depth, keeping token order) with one sort
+        depths = np.fromiter((depth for _, depth in tokens_with_depth[:num_tokens]),
+                             dtype=np.int64, count=num_tokens)
+        order = np.argsort(depths, kind='stable')
+        sorted_depths = depths[order]
+        group_starts = np.flatnonzero(sorted_depths[1:] != sorted_depths[:-1]) + 1
+        groups = np.split(order, group_starts) if num_tokens else []
+        # Tokens are reordered by depth in one gather, so each phrase is a contiguous view
+        bounds = np.concatenate(([0], group_starts, [num_tokens]))
+        if by_layer is not None:
+            by_layer = by_layer[:, order]
 
         phrase_activations = []
-        for depth in sorted(depth_to_tokens.keys()):
-            tokens = depth_to_tokens[depth]
-            tokens_layers_list = depth_to_activations[depth]
-
-            layer_to_activations = defaultdict(list)
-            for token_layers in tokens_layers_list:
-                for layer_index, activation in token_layers:
-                    layer_to_activations[layer_index].append(activation)
-
-            aggregated_layers = []
-            for layer_index in sorted(layer_to_activations.keys()):
-                activations_list = layer_to_activations[layer_index]
-                aggregated_activation = self.aggregate_activation_list(activations_list, method=method)
-                aggregated_layers.append({
+        for group, start, end in zip(groups, bounds[:-1], bounds[1:]):
+            if by_layer is not None:
+                # Every layer of the phrase is reduced in one call on a (layers, tokens, hidden) slice
+                aggregated = self._reduce_activations(by_layer[:, start:end], method, axis=1)
+                aggregated_layers = [{"index": layer_index, "values": values}
+                                     for layer_index, values in zip(layer_indices, aggregated)]
+            else:
+                layer_to_activations = defaultdict(list)
+                for position in group:
+                    for layer_index, activation in activations[position]:
+                        layer_to_activations[layer_index].append(activation)
+                aggregated_layers = [{
                     "index": layer_index,
-                    "values": aggregated_activation.tolist()
-                })
+                    "values": self._reduce_activations(
+                        np.stack(layer_to_activations[layer_index]), method)
+                } for layer_index in sorted(layer_to_activations)]
 
-            phrase_key = ' '.join(tokens)
-            phrase_feature = {
-                "phrase": phrase_key,
+            phrase_activations.append({
+                "phrase": ' '.join([tokens_with_depth[position][0] for position in group]),
                 "layers": aggregated_layers
-            }
-            phrase_activations.append(phrase_feature)
+            })
 
         output_data = {
             "linex_index": 0,
@@ -502,11 +868,63 @@ class ActivationAnnotator:
 
         return output_data
 
+    @staticmethod
+    def _stack_by_layer(activations: List[List[Tuple[int, np.ndarray]]]
+                        ) -> Tuple[Union[np.ndarray, None], List[int]]:
+        """
+        Stack the activations of all tokens into one (layers, tokens, hidden) array.
+        
+        Args:
+            activations: List of activation layers for each token
+            
+        Returns:
+            Tuple containing:
+                - The stacked array, or None if the tokens do not all have the same layers
+                  in increasing index order
+                - The layer indices along the first axis
+        """
+        if not activations:
+            return None, []
+        layer_indices = [layer_index for layer_index, _ in activations[0]]
+        if any(a >= b for a, b in zip(layer_indices, layer_indices[1:])) or any(
+                [layer_index for layer_index, _ in token_layers] != layer_indices
+                for token_layers in activations):
+            return None, layer_indices
+        return ActivationAnnotator._stack_tokens(activations).swapaxes(0, 1), layer_indices
+
+    @staticmethod
+    def _stack_tokens(activations: List[List[Tuple[int, np.ndarray]]]) -> np.ndarray:
+        """
+        Stack the activations of all tokens into one (tokens, layers, hidden) array.
+        
+        Every (token, layer) vector is stacked in a single call and the result reshaped,
+        rather than stacking each token's layers separately.
+        
+        Args:
+            activations: Non-empty list of activation layers for each token
+            
+        Returns:
+            numpy.ndarray: The stacked activations
+            
+        Raises:
+            ValueError: If the tokens do not all have the same number of layers and hidden size
+        """
+        num_layers = len(activations[0])
+        if any(len(token_layers) != num_layers for token_layers in activations):
+            raise ValueError("All tokens must have the same number of layers")
+        stacked = np.stack([activation for token_layers in activations for _, activation in token_layers])
+        return stacked.reshape((len(activations), num_layers) + stacked.shape[1:])
+
     def write_phrase_activations(self, phrase_activations: Dict[str, Any], 
                                output_dir: str) -> None:
         """
         Write phrase activations to a JSON file.
         
+        When binary_output is enabled and every phrase has the same layers and value size
+        (i.e. for any aggregation method but 'concat'), they are written to a
+        '<prefix>_phrasal_activations.npz' archive instead, holding the 'phrases', their
+        'layer_indices' and the (phrases, layers, features) float32 'activations'.
+        
         Args:
             phrase_activations: Dictionary containing phrase activation data
             output_dir: Directory to save the output file
@@ -515,9 +933,27 @@ class ActivationAnnotator:
             IOError: If unable to write to output directory
             TypeError: If phrase_activations is not JSON-serializable
         """
+        features = phrase_activations["features"]
+        if self.binary_output and features:
+            layer_indices = [layer["index"] for layer in features[0]["layers"]]
+            shape = np.shape(features[0]["layers"][0]["values"]) if layer_indices else None
+            if all([layer["index"] for layer in feature["layers"]] == layer_indices
+                   and all(np.shape(layer["values"]) == shape for layer in feature["layers"])
+                   for feature in features):
+                mapping_file = os.path.join(output_dir, f"{self.output_prefix}_phrasal_activations.npz")
+                np.savez(
+                    mapping_file,
+                    phrases=np.array([feature["phrase"] for feature in features], dtype=str),
+                    layer_indices=np.array(layer_indices, dtype=np.int32),
+                    activations=np.array([[layer["values"] for layer in feature["layers"]]
+                                          for feature in features], dtype=np.float32)
+                )
+                print(f"Phrase activations saved to '{mapping_file}'.")
+                return
+
         mapping_file = os.path.join(output_dir, f"{self.output_prefix}_phrasal_activations.json")
-        with open(mapping_file, 'w', encoding='utf-8') as f:
-            json.dump(phrase_activations, f, indent=2)
+        with open(mapping_file, 'wb') as f:
+            f.write(orjson.dumps(phrase_activations, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
         print(f"Phrase activations saved to '{mapping_file}'.")
 
     def write_aggregated_activations(self, tokens_with_depth: List[Tuple[str, int]], 
@@ -526,6 +962,13 @@ class ActivationAnnotator:
         """
         Write mean-aggregated activations across all layers to a JSON file.
         
+        When quantize is enabled the activations are written to an .npz file instead,
+        holding int8 values 'q' and per-token float scales 'scale' (original values are
+        approximately q * scale) together with the 'tokens' and their 'depths'.
+        When binary_output is enabled the (tokens, features) float32 matrix is saved with
+        np.save (so it can be memory-mapped with np.load(..., mmap_mode='r')) and the tokens
+        and depths go to a '<prefix>_aggregated_tokens.json' sidecar.
+        
         Args:
             tokens_with_depth: List of (token, depth) tuples
             activations: List of activation layers for each token
@@ -535,17 +978,51 @@ class ActivationAnnotator:
             IOError: If unable to write to output directory
             ValueError: If token and activation lengths don't match
         """
+        num_tokens = min(len(tokens_with_depth), len(activations))
+        tokens_with_depth = tokens_with_depth[:num_tokens]
+
+        if num_tokens:
+            # Stack every token's layers into one (tokens, layers, hidden) array and reduce once
+            layers_array = self._stack_tokens(activations[:num_tokens])
+            aggregated = self._reduce_activations(layers_array, self.aggregation_method, axis=1)
+        else:
+            aggregated = np.empty((0, 0))
+
+        if self.quantize:
+            aggregated_file = os.path.join(output_dir, f"{self.output_prefix}_aggregated_activations.npz")
+            quantized, scale = self._quantize_int8(aggregated)
+            np.savez_compressed(
+                aggregated_file,
+                q=quantized,
+                scale=scale,
+                tokens=np.array([token for token, _ in tokens_with_depth], dtype=str),
+                depths=np.array([depth for _, depth in tokens_with_depth], dtype=np.int32),
+                aggregation_method=self.aggregation_method
+            )
+            print(f"Aggregated activations saved to '{aggregated_file}'.")
+            return
+
+        if self.binary_output:
+            aggregated_file = os.path.join(output_dir, f"{self.output_prefix}_aggregated_activations.npy")
+            tokens_file = os.path.join(output_dir, f"{self.output_prefix}_aggregated_tokens.json")
+            np.save(aggregated_file, aggregated.astype(np.float32, copy=False))
+            with open(tokens_file, 'wb') as f:
+                f.write(orjson.dumps({
+                    "aggregation_method": self.aggregation_method,
+                    "tokens": [token for token, _ in tokens_with_depth],
+                    "depths": [depth for _, depth in tokens_with_depth]
+                }))
+            print(f"Aggregated activations saved to '{aggregated_file}' (tokens in '{tokens_file}').")
+            return
+
         aggregated_file = os.path.join(output_dir, f"{self.output_prefix}_aggregated_activations.json")
         
         token_activations = []
-        
-        for (token, _), token_layers in zip(tokens_with_depth, activations):
-            layer_activations = [layer[1] for layer in token_layers]
-            aggregated = self.aggregate_activation_list(layer_activations, method=self.aggregation_method)
-            
+
+        for (token, _), token_aggregated in zip(tokens_with_depth, aggregated):
             token_feature = {
                 "token": token,
-                "aggregated_values": aggregated.tolist()
+                "aggregated_values": token_aggregated
             }
             token_activations.append(token_feature)
         
@@ -554,7 +1031,32 @@ class ActivationAnnotator:
             "features": token_activations
         }
         
-        with open(aggregated_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2)
+        # orjson serializes the float32 rows directly, without a .tolist() round trip
+        with open(aggregated_file, 'wb') as f:
+            f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        
+        print(f"Aggregated activations saved to '{aggregated_file}'.")
+
+    @staticmethod
+    def _quantize_int8(activations_array: np.ndarray, axis: int = -1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Symmetrically quantize an activation matrix to int8.
         
-        print(f"Aggregated activations saved to '{aggregated_file}'.")
\ No newline at end of file
+        Args:
+            activations_array: (tokens, features) float array
+            axis: Axis each scale is shared along; -1 scales each token (row), 0 each
+                  feature (column)
+            
+        Returns:
+            Tuple containing:
+                - int8 array with the same shape as the input
+                - float32 scales, of size 1 along axis, such that values ~= quantized * scale
+        """
+        if activations_array.size == 0:
+            scale_shape = list(activations_array.shape)
+            scale_shape[axis] = 1
+            return activations_array.astype(np.int8), np.ones(scale_shape, dtype=np.float32)
+        scale = np.abs(activations_array).max(axis=axis, keepdims=True) / 127.0
+        scale[scale == 0] = 1.0
+        quantized = np.clip(np.round(activations_array / scale), -127, 127).astype(np.int8)
+        return quantized, scale.astype(np.float32)
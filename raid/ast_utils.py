@@ -0,0 +1,129 @@
+"""
+Tree-sitter traversal and parsing helpers shared by the token extractor and the pattern extractor.
+"""
+
+from typing import List, Optional, Tuple
+
+from tree_sitter import Node, Parser, Tree
+
+
+def nodes_at_level(node: Node, target_level: int) -> Tuple[List[Node], List[int]]:
+    """
+    Collect the nodes a given number of levels below a node, in source order.
+
+    Branches that end before the target level contribute their leaves instead, so a
+    negative target level collects every leaf. The tree is walked with a cursor, which
+    avoids recursion and building a list of children for every node.
+
+    Args:
+        node: Root of the subtree to walk
+        target_level: Number of levels below node to collect
+
+    Returns:
+        The collected nodes and, in parallel, their levels below node
+    """
+    nodes = []
+    levels = []
+    cursor = node.walk()
+    current_level = 0
+
+    while True:
+        current = cursor.node
+        # if level is beyond tree, appends the leaf
+        if current_level == target_level or current.child_count == 0:
+            nodes.append(current)
+            levels.append(current_level)
+        elif cursor.goto_first_child():
+            current_level += 1
+            continue
+
+        # climb back up until a sibling is found, never leaving the starting node
+        while current_level > 0 and not cursor.goto_next_sibling():
+            cursor.goto_parent()
+            current_level -= 1
+        if current_level == 0:
+            return nodes, levels
+
+
+def common_affix_lengths(old: bytes, new: bytes) -> Tuple[int, int]:
+    """
+    Measure the common prefix of two byte strings and their common suffix after it.
+
+    Args:
+        old: The previous source code
+        new: The new source code
+
+    Returns:
+        The lengths of the common prefix and of the common suffix not overlapping it
+    """
+    old_view = memoryview(old)
+    new_view = memoryview(new)
+    # Binary searches over slice comparisons keep the byte comparisons in C
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old_view[:mid] == new_view[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    low, high = 0, min(len(old), len(new)) - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old_view[len(old) - mid:] == new_view[len(new) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return prefix, low
+
+
+def point(source: bytes, offset: int) -> Tuple[int, int]:
+    """
+    Convert a byte offset into a tree-sitter (row, column) point.
+
+    Args:
+        source: The source code
+        offset: Byte offset into source
+
+    Returns:
+        The zero-based row and byte column of the offset
+    """
+    return source.count(b'\n', 0, offset), offset - (source.rfind(b'\n', 0, offset) + 1)
+
+
+def parse_incrementally(parser: Parser, source: bytes,
+                        previous: Optional[Tuple[bytes, Tree]] = None) -> Tree:
+    """
+    Parse source code, reusing the unchanged parts of a previously parsed version.
+
+    The previous tree is edited to describe how its source changed into the new one (one
+    edit spanning everything between the common prefix and suffix), so tree-sitter reuses
+    its subtrees; it must not be used afterwards.
+
+    A previous tree with syntax errors is not reused, so erroneous code that keeps failing
+    to parse is not parsed twice on every version.
+
+    Args:
+        parser: Parser for the language of the source
+        source: Source code to parse
+        previous (Tuple[bytes, Tree], optional): Earlier source and its tree.
+                                                  If None, the source is parsed from scratch.
+
+    Returns:
+        The syntax tree of source
+    """
+    if previous is None or previous[1].root_node.has_error:
+        return parser.parse(source)
+    old_source, old_tree = previous
+    prefix, suffix = common_affix_lengths(old_source, source)
+    old_end = len(old_source) - suffix
+    new_end = len(source) - suffix
+    if prefix != old_end or prefix != new_end:
+        old_tree.edit(prefix, old_end, new_end, point(source, prefix),
+                      point(old_source, old_end), point(source, new_end))
+    tree = parser.parse(source, old_tree)
+    # Error recovery depends on the reused subtrees, so erroneous code is reparsed from
+    # scratch to get the same tree as a fresh parse
+    if tree.root_node.has_error:
+        tree = parser.parse(source)
+    return tree
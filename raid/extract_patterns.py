@@ -1,54 +1,295 @@
 import csv
+import os
 import re
-from typing import List
+import sys
+import threading
+from typing import Hashable, List
 from tree_sitter import Language, Parser, Node
 import tree_sitter_java as tsjava
 import tree_sitter_python as tspython
-import pandas as pd
-import json
-
-from .label_dictionary import LabelDictionary
+import orjson
+
+from .ast_cache import grammar_version
+from .ast_utils import nodes_at_level, parse_incrementally
+from .label_dictionary import NON_LEAF_TYPES, convert_label
+
+
+# Grammars supported by the extractor, loaded once at import
+LANGUAGES = {
+    'java': Language(tsjava.language()),
+    'python': Language(tspython.language()),
+}
+
+# Installed grammar versions, part of every cache namespace so grammar upgrades miss the cache
+GRAMMAR_VERSIONS = {
+    'java': grammar_version('tree-sitter-java'),
+    'python': grammar_version('tree-sitter-python'),
+}
+
+# Numeric kind id of identifier nodes in each grammar, so leaves are classified without string compares
+IDENTIFIER_KIND_IDS = {name: language.id_for_node_kind('identifier', True) for name, language in LANGUAGES.items()}
+
+# Parsers for LANGUAGES, shared by all extractors of a thread
+_PARSER_LOCAL = threading.local()
+
+# Number of recently parsed documents per thread whose trees are kept for incremental reparsing
+RECENT_TREES_LIMIT = 10
+
+# Naming-convention patterns, compiled once at import and tried in this order.
+CASES = {
+    'single_letter': re.compile('^[a-zA-Z]$'),
+    'camel_case': re.compile('^[a-z][a-z]*(?:[A-Z][a-z0-9]+)*[a-zA-Z]?$'),
+    'pascal_case': re.compile('^([A-Z][a-z]+)*[A-Z][a-z]*$'),
+    'snake_case': re.compile('^[a-z]+(_[a-z]+)*$'),
+    'screaming_snake_case': re.compile('^[A-Z]+(_[A-Z]+)*$'),
+    'prefix': re.compile('^(get|set)[A-Za-z]+$'),
+    'numeric': re.compile('^[a-zA-Z].+[0-9]+$'),
+}
+
+# All cases as one alternation of named groups: the first alternative that matches is the
+# same case the sequential checks would pick, and match.lastgroup names it.
+CASES_ALTERNATION = re.compile('|'.join(f'(?P<{name}>{pattern.pattern})' for name, pattern in CASES.items()))
+
+# Token clean-up patterns for the CSV output, applied in this order by _csv_token.
+_UNICODE_ESCAPE = re.compile(rb'\\u[0-9A-Fa-f]{4}')
+_NON_ASCII_RUN = re.compile(r'\n?([^\x00-\x7F]+)\n?')
+_DOUBLE_ESCAPE = re.compile(r'\\\\([nrt"\'])')
+_DOUBLE_UNICODE_ESCAPE = re.compile(r'\\\\u')
+_RESIDUAL_SLASHES = re.compile(r'\\\\\\(?=\S)')
+
+# Interned "<tag>-<type>" labels; the set of tags and node types is small.
+_BIO_LABELS = {}
+
+
+def _bio_label(tag, label_type) -> str:
+    """
+    Returns the shared, interned string "<tag>-<label_type>".
+
+    Parameters
+    ----------
+    tag : str
+        The BIO tag ('B', 'I' or 'O').
+    label_type : str
+        The label type of the node.
+
+    Returns
+    -------
+    str
+        The label string, allocated once per distinct pair.
+    """
+    key = (tag, label_type)
+    label = _BIO_LABELS.get(key)
+    if label is None:
+        label = _BIO_LABELS[key] = sys.intern(f"{tag}-{label_type}")
+    return label
+
+
+def _node_text(node) -> str:
+    """
+    Decodes the source text covered by a node.
+
+    Parameters
+    ----------
+    node : tree_sitter.Node
+        The node whose text is wanted.
+
+    Returns
+    -------
+    str
+        The UTF-8 decoded text of the node; invalid bytes become \\xNN escapes.
+    """
+    return node.text.decode('utf-8', 'backslashreplace')
+
+
+def _bio_tags(names, is_leaf, is_lone_symbol, is_first_child) -> List[str]:
+    """
+    Assigns a B, I or O tag to each node of a layer from flat per-node attributes.
+
+    Parameters
+    ----------
+    names : List[Hashable]
+        The label type of each node, or any value identifying it such as its grammar id.
+    is_leaf : List[bool]
+        Whether each node has no children.
+    is_lone_symbol : List[bool]
+        Whether each node is a single-character token whose type is its own text.
+    is_first_child : List[bool]
+        Whether each node is the first child of its parent.
+
+    Returns
+    -------
+    List[str]
+        The tag ('B', 'I' or 'O') of each node.
+    """
+    if not names:
+        return []
+    # The first node can only be O (leaf) or B, which lets the loop below drop its i > 0 checks
+    if is_leaf[0]:
+        tags = ['O']
+        prev = None
+        b_clause = False
+    else:
+        tags = ['B']
+        prev = names[0]
+        b_clause = True
+    append_tag = tags.append
+    nodes = zip(names, is_leaf, is_lone_symbol, is_first_child)
+    next(nodes)
+    for name, leaf, lone_symbol, first_child in nodes:
+        if leaf or (lone_symbol and prev != name):
+            append_tag('O')
+            b_clause = False
+        elif b_clause and not first_child:
+            append_tag('I')
+        else:
+            append_tag('B')
+            prev = name
+            b_clause = True
+    return tags
 
 
 class PatternExtractor:
 
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        Parameters
+        ----------
+        cache : ASTCache, optional
+            Cache of the labels computed for a source, keyed by its content; if None, every
+            source is parsed.
+        """
+        self.cases = CASES
+        self.cache = cache
+        self.cases_alternation = CASES_ALTERNATION
+
+
+    def get_parser(self, language):
+        """
+        Returns the parser for a language, created once per thread and shared by all extractors.
+
+        Parameters
+        ----------
+        language : str
+            The language to parse ('java' or 'python').
+
+        Returns
+        -------
+        tree_sitter.Parser or None
+            The parser, or None if the language is not supported.
+        """
+        parsers = getattr(_PARSER_LOCAL, 'parsers', None)
+        if parsers is None:
+            parsers = _PARSER_LOCAL.parsers = {}
+        parser = parsers.get(language)
+        if parser is None:
+            if language not in LANGUAGES:
+                print("Please pick Java or Python as a language.")
+                return None
+            parser = parsers[language] = Parser(LANGUAGES[language])
+        return parser
+
+
+    def parse(self, source_code, language):
+        """
+        Parses source code from scratch.
+
+        Parameters
+        ----------
+        source_code : bytes
+            The code to be parsed.
+        language : str
+            The language in which the code should be parsed.
+
+        Returns
+        -------
+        tree_sitter.Tree or None
+            The syntax tree, or None if the language is not supported.
+        """
+        parser = self.get_parser(language)
+        if parser is None:
+            return None
+        return parser.parse(source_code)
+
+
+    def _parse_document(self, source_code, language, document_id=None):
+        """
+        Parses a version of a document, incrementally from the tree of its previous version.
+
+        The previous tree of the same document, parsed recently in this thread, is edited to
+        describe how its source changed into source_code, so that tree-sitter reuses the subtrees
+        of the unchanged prefix and suffix. Trees of other documents are never reused. These trees
+        are only read by the extractor's own methods and are not handed out, so editing them
+        cannot change a tree a caller still holds.
+
+        Parameters
+        ----------
+        source_code : bytes
+            The code to be parsed.
+        language : str
+            The language in which the code should be parsed.
+        document_id : Hashable, optional
+            Identifies the document, such as its output file name. If None, the source is
+            parsed from scratch and its tree is not kept.
 
-        self.cases = {
-            'single_letter': '^[a-zA-Z]$',
-            'camel_case': '^[a-z][a-z]*(?:[A-Z][a-z0-9]+)*[a-zA-Z]?$',
-            'pascal_case': '^([A-Z][a-z]+)*[A-Z][a-z]*$',
-            'snake_case': '^[a-z]+(_[a-z]+)*$',
-            'screaming_snake_case': '^[A-Z]+(_[A-Z]+)*$',
-            'prefix': '^(get|set)[A-Za-z]+$',
-            'numeric': '^[a-zA-Z].+[0-9]+$',
-        }
+        Returns
+        -------
+        tree_sitter.Tree or None
+            The syntax tree, or None if the language is not supported.
+        """
+        if document_id is None:
+            return self.parse(source_code, language)
+        parser = self.get_parser(language)
+        if parser is None:
+            return None
+        recent_trees = _PARSER_LOCAL.__dict__.setdefault('recent_trees', {})
+        key = (language, document_id)
+        tree = parse_incrementally(parser, source_code, recent_trees.pop(key, None))
+        # Dicts keep insertion order, so the first entry is the least recently parsed document
+        recent_trees[key] = (source_code, tree)
+        if len(recent_trees) > RECENT_TREES_LIMIT:
+            del recent_trees[next(iter(recent_trees))]
+        return tree
 
 
     def check_token(self, token, regex):
-        pattern = self.cases[regex]
-        return bool(re.match(pattern, token))
+        return self.cases[regex].match(token) is not None
 
 
     def find_label_with_regex(self, token):
-        for key in self.cases:
-            if self.check_token(token, key):
-                return key
-        return 'O'
+        match = self.cases_alternation.match(token)
+        return 'O' if match is None else match.lastgroup
 
 
     def search_for_ancestor_type(self, leaf_node, type_to_search):
         cursor = leaf_node
-        while cursor.parent:
+        while cursor is not None:
             if cursor.type == type_to_search:
-                return cursor.type
-            else:
-                cursor = cursor.parent
-        if cursor.type == type_to_search:
-            return cursor.type
-        return leaf_node.type# if leaf_node.type != str(leaf_node.text)[2:-1] else leaf_node.parent.type
+                return type_to_search
+            cursor = cursor.parent
+        return leaf_node.type
 
 
+    def get_ancestor_types(self, leaf_node):
+        """
+        Collects the types of a node and all of its ancestors in one walk up the tree.
+
+        Parameters
+        ----------
+        leaf_node : tree_sitter.Node
+            The node to start from.
+
+        Returns
+        -------
+        frozenset
+            The set of node types on the path from the node to the root.
+        """
+        types = set()
+        cursor = leaf_node
+        while cursor is not None:
+            types.add(cursor.type)
+            cursor = cursor.parent
+        return frozenset(types)
+
 
 
     def get_nodes_at_level(self, node, target_level) -> List[Node]:
@@ -67,30 +308,16 @@ class PatternExtractor:
         List[Node]
             A list of nodes at the target level down.
         """
-
-        def retrieve_nodes(node, target_level, current_level=0):
-            nodes_at_level = []
-
-            # if level is beyond tree, appends the leaf
-            if current_level == target_level or node.child_count == 0:
-                nodes_at_level.append(node)
-            else:
-                for child in node.children:
-                    nodes_at_level.extend(retrieve_nodes(child, target_level, current_level + 1))
-
-            return nodes_at_level
-
-        # print('target level:', target_level)
-        return retrieve_nodes(node, target_level)
+        return nodes_at_level(node, target_level)[0]
 
 
     def find_bio_label_type(self, node) -> str:
         return node.grammar_name
 
 
-    def extract_bio_labels_from_layer(self, source_code, language, depth=-1):
+    def extract_bio_labels_from_layer(self, source_code, language, depth=-1, verbose=False):
         """
-        Parses the source code, then generates and displays the separate tokens and labels for a specific layer.
+        Parses the source code, then generates the separate tokens and labels for a specific layer.
         Ignores specific labels.
 
         Parameters
@@ -101,58 +328,146 @@ class PatternExtractor:
             The language in which the code snippet should be parsed.
         depth : int, optional
             The desired depth to retrieve from the tree; the default value retrieves leaf nodes.
+        verbose : bool, optional
+            Whether to also print the tokens and labels as a table.
         """
-        if language == 'java':
-            code_language = Language(tsjava.language())
-        elif language == 'python':
-            code_language = Language(tspython.language())
-        else:
-            print("Please pick Java or Python as a language.")
+        if self.get_parser(language) is None:
             return
-        parser = Parser(code_language)
 
-        tree = parser.parse(source_code)
-        root_node = tree.root_node
+        namespace = f"bio-layer:{language}:{GRAMMAR_VERSIONS[language]}:{depth}"
+        result = None if self.cache is None else self.cache.get(namespace, source_code)
+        if result is None:
+            result = self._bio_labels_from_layer(self.parse(source_code, language).root_node, depth,
+                                                 IDENTIFIER_KIND_IDS[language])
+            if self.cache is not None:
+                self.cache.put(namespace, source_code, result)
+        token_data, label_data, leaf_labels = result
+
+        if verbose:
+            # pandas is only needed for this debug table, so it is imported lazily
+            import pandas as pd
+            df = pd.DataFrame({"TOKEN": token_data,
+                               "LABEL": label_data,
+                               "REGEX": leaf_labels})
+            with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+                print(df)
+            print('\n')
+
+        return token_data, label_data, leaf_labels
+
+
+    def _bio_labels_from_layer(self, root_node, depth, identifier_kind_id):
+        """
+        Computes the tokens, BIO labels and regex labels of one layer of a parsed tree.
+
+        Parameters
+        ----------
+        root_node : tree_sitter.Node
+            The root node of the AST.
+        depth : int
+            The desired depth to retrieve from the tree; -1 retrieves leaf nodes.
+        identifier_kind_id : int
+            The kind id of identifier nodes in the tree's grammar.
 
+        Returns
+        -------
+        Tuple[List[str], List[str], List[str]]
+            The tokens, their BIO labels and their regex labels.
+        """
         leaf_nodes = self.get_nodes_at_level(root_node, depth)
-        leaf_labels = []
-        bio = []
-        prev = None
-        b_clause = False
-        for i, node in enumerate(leaf_nodes):
-            name = self.find_bio_label_type(node)
-            leaf_text = str(node.text)[2:-1]
-            leaf_labels.append(self.find_label_with_regex(leaf_text) if node.type == 'identifier' else 'O')
-
-            if node.child_count == 0 or (node.type == leaf_text and i > 0 and (prev != name)
-                    and len(leaf_text) == 1 and not leaf_labels[-1] == 'single_letter'):
-                bio.append(leaf_text + ": O-" + name)
-                b_clause = False
-            elif i > 0 and b_clause and not (node == node.parent.child(0)):
-                bio.append(leaf_text + ": I-" + name)
-            else:
-                bio_type = 'B'
-                bio.append(leaf_text + ": " + bio_type + '-' + name)
-                prev = name
-                b_clause = True
+        # get_nodes_at_level never goes above the root, so a negative depth collects only leaves,
+        # which are always tagged O; the per-node BIO inputs are only gathered for inner layers
+        label_layer = self._label_leaf_layer if depth < 0 else self._label_inner_layer
+        return label_layer(leaf_nodes, identifier_kind_id)
+
+
+    def _label_leaf_layer(self, leaf_nodes, identifier_kind_id):
+        """
+        Computes the tokens, BIO labels and regex labels of a layer made only of leaves.
 
-        token_data = []
+        Parameters
+        ----------
+        leaf_nodes : List[Node]
+            The leaves of the tree, in order.
+        identifier_kind_id : int
+            The kind id of identifier nodes in the tree's grammar.
+
+        Returns
+        -------
+        Tuple[List[str], List[str], List[str]]
+            The tokens, their BIO labels and their regex labels.
+        """
+        leaf_labels = []
+        leaf_texts = []
         label_data = []
-        for element in bio:
-            split_element = element.split(": ")
-            token_data.append(split_element[0])
-            label_data.append(split_element[1])
+        # Every leaf is tagged O, so its label only depends on its grammar id
+        labels = {}
+        for node in leaf_nodes:
+            grammar_id = node.grammar_id
+            label = labels.get(grammar_id)
+            if label is None:
+                label = labels[grammar_id] = _bio_label('O', self.find_bio_label_type(node))
+            leaf_text = _node_text(node)
+            leaf_labels.append(self.find_label_with_regex(leaf_text) if node.kind_id == identifier_kind_id else 'O')
+            leaf_texts.append(leaf_text)
+            label_data.append(label)
 
-        data = {"TOKEN": token_data,
-                "LABEL": label_data,
-                "REGEX": leaf_labels}
+        return leaf_texts, label_data, leaf_labels
 
-        df = pd.DataFrame(data)
-        with pd.option_context('display.max_rows', None, 'display.max_columns', None):
-            print(df)
-        print('\n')
 
-        return token_data, label_data, leaf_labels
+    def _label_inner_layer(self, leaf_nodes, identifier_kind_id):
+        """
+        Computes the tokens, BIO labels and regex labels of a layer that may contain inner nodes.
+
+        Parameters
+        ----------
+        leaf_nodes : List[Node]
+            The nodes of the layer, in order.
+        identifier_kind_id : int
+            The kind id of identifier nodes in the tree's grammar.
+
+        Returns
+        -------
+        Tuple[List[str], List[str], List[str]]
+            The tokens, their BIO labels and their regex labels.
+        """
+        leaf_labels = []
+        leaf_texts = []
+        name_ids = []
+        is_leaf = []
+        is_lone_symbol = []
+        is_first_child = []
+        # Nodes are told apart by numeric kind id; the type string is only needed for one-character
+        # tokens and is looked up once per id
+        type_names = {}
+        label_types = {}
+        for node in leaf_nodes:
+            kind_id = node.kind_id
+            grammar_id = node.grammar_id
+            if grammar_id not in label_types:
+                label_types[grammar_id] = self.find_bio_label_type(node)
+            leaf_text = _node_text(node)
+            leaf_label = self.find_label_with_regex(leaf_text) if kind_id == identifier_kind_id else 'O'
+            leaf = node.child_count == 0
+            parent = None if leaf else node.parent
+
+            leaf_labels.append(leaf_label)
+            leaf_texts.append(leaf_text)
+            name_ids.append(grammar_id)
+            is_leaf.append(leaf)
+            lone_symbol = len(leaf_text) == 1 and leaf_label != 'single_letter'
+            if lone_symbol:
+                node_type = type_names.get(kind_id)
+                if node_type is None:
+                    node_type = type_names[kind_id] = node.type
+                lone_symbol = node_type == leaf_text
+            is_lone_symbol.append(lone_symbol)
+            is_first_child.append(parent is None or node == parent.child(0))
+
+        tags = _bio_tags(name_ids, is_leaf, is_lone_symbol, is_first_child)
+        label_data = [_bio_label(tag, label_types[name_id]) for tag, name_id in zip(tags, name_ids)]
+
+        return leaf_texts, label_data, leaf_labels
 
 
     def create_tree_json(self, source_code, language, name):
@@ -168,39 +483,42 @@ class PatternExtractor:
         name : str
             The desired name of the json file.
         """
-        if language == 'java':
-            code_language = Language(tsjava.language())
-        elif language == 'python':
-            code_language = Language(tspython.language())
-        else:
-            print("Please pick Java or Python as a language.")
+        if self.get_parser(language) is None:
             return
-        parser = Parser(code_language)
-        tree = parser.parse(source_code)
-        root_node = tree.root_node
-        label_dictionary = LabelDictionary()
+        root_node = self._parse_document(source_code, language, name).root_node
 
-        def tree_to_dict(node):
+        def node_to_dict(node):
             # Convert the current node's attributes into a dictionary
-            node_dict = {
-                'token': str(node.text)[2:-1],
-                'label': label_dictionary.convert_label(self.find_bio_label_type(node)),
+            return {
+                'token': _node_text(node),
+                'label': convert_label(self.find_bio_label_type(node)),
                 'sub_tokens': []
             }
 
-            # Recursively convert each child and append to the 'children' list
-            for child in node.children:
-                node_dict['sub_tokens'].append(tree_to_dict(child))
-
-            return node_dict
-
-
-        tree_dict = tree_to_dict(root_node)
-        with open(name + '.json', 'w') as json_file:
-            json.dump(tree_dict, json_file, indent=4)
-
-
-    def search_for_type(self, node_type, leaf_nodes, label_dictionary):
+        # Walk with a cursor instead of recursing over node.children, so no child lists are built
+        # and deeply nested code cannot hit the recursion limit
+        tree_dict = node_dict = node_to_dict(root_node)
+        cursor = root_node.walk()
+        # sub_tokens of each ancestor of the cursor's node, innermost last
+        parents_sub_tokens = []
+        while True:
+            if cursor.goto_first_child():
+                parents_sub_tokens.append(node_dict['sub_tokens'])
+            else:
+                # climb back up until a sibling is found, never leaving the root
+                while parents_sub_tokens and not cursor.goto_next_sibling():
+                    cursor.goto_parent()
+                    parents_sub_tokens.pop()
+                if not parents_sub_tokens:
+                    break
+            node_dict = node_to_dict(cursor.node)
+            parents_sub_tokens[-1].append(node_dict)
+        # orjson serializes in C and only supports two-space indentation
+        with open(name + '.json', 'wb') as json_file:
+            json_file.write(orjson.dumps(tree_dict, option=orjson.OPT_INDENT_2))
+
+
+    def search_for_type(self, node_type, leaf_nodes, ancestor_types=None):
         """
         For the given node type, returns list of labels for all leaves.
 
@@ -210,8 +528,9 @@ class PatternExtractor:
             The node type (non-leaf) to be parsed.
         leaf_nodes : List[Node]
             The list of leaf nodes.
-        label_dictionary : LabelDictionary
-            Label dictionary to be used for converting labels to desired format.
+        ancestor_types : List[frozenset], optional
+            The result of get_ancestor_types for each leaf, shared across node types so the
+            tree is only walked once per leaf; computed by walking up the tree if omitted.
 
         Returns
         -------
@@ -220,31 +539,97 @@ class PatternExtractor:
         """
         bio = []
         prev = None
-        for node in leaf_nodes:
-            label_type = self.search_for_ancestor_type(node, node_type)
+        append_bio = bio.append
+
+        def bio_label(tag, label_type):
+            return _bio_label(tag, convert_label(label_type))
+
+        for i, node in enumerate(leaf_nodes):
+            if ancestor_types is None:
+                label_type = self.search_for_ancestor_type(node, node_type)
+            else:
+                label_type = node_type if node_type in ancestor_types[i] else node.type
             if label_type == node_type:
-                bio_label = 'I' if prev == label_type else 'B'
+                tag = 'I' if prev == label_type else 'B'
             else:
-                bio_label = 'O'
-            bio.append(bio_label + '-' + label_dictionary.convert_label(label_type))
+                tag = 'O'
+            append_bio(bio_label(tag, label_type))
 
             if prev == node_type and prev != label_type:
-                bio[-2] = 'O' + bio[-2][1:]  # last label is always O
+                bio[-2] = bio_label('O', node_type)  # last label is always O
 
             prev = label_type
 
         if prev == node_type:
-            bio[-1] = 'O' + bio[-1][1:]  # last label is always O
+            bio[-1] = bio_label('O', node_type)  # last label is always O
 
         return bio
 
 
     def regex_conversion(self, token):
-        if re.search(r'\\u[0-9A-Fa-f]{4}', str(token)[2:-1]):
-            return re.sub(r'\x00', r'\\u0000',
-                          re.sub(r'\n?([^\x00-\x7F]+)\n?', '', token.decode('ascii').strip()))
-        return re.sub(r'\x00', r'\\u0000',
-               re.sub(r'\n?([^\x00-\x7F]+)\n?', '', token.decode('raw_unicode_escape').strip()))
+        if _UNICODE_ESCAPE.search(token):
+            decoded = token.decode('ascii')
+        else:
+            decoded = token.decode('raw_unicode_escape')
+        return _NON_ASCII_RUN.sub('', decoded.strip()).replace('\x00', '\\u0000')
+
+
+    def _csv_token(self, token):
+        """
+        Converts the raw text of a leaf into its CSV form in a single pass.
+
+        Parameters
+        ----------
+        token : bytes
+            The raw text of the leaf node.
+
+        Returns
+        -------
+        str
+            The token with non-ASCII runs removed and escape sequences normalised.
+        """
+        token = self.regex_conversion(token)
+        # Undo doubled escapes, then fix any residual issues with slashes
+        token = _DOUBLE_UNICODE_ESCAPE.sub(r'\\u', _DOUBLE_ESCAPE.sub(r'\\\1', token))
+        if 'FILL_WITH_ONE_SLASH' in token:
+            return _RESIDUAL_SLASHES.sub('FILL_WITH_ONE_SLASH', token).replace('FILL_WITH_ONE_SLASH', '\\\\')
+        return _RESIDUAL_SLASHES.sub('\\\\', token)
+
+
+    def _csv_columns(self, root_node):
+        """
+        Computes the CSV columns (tokens, regex labels and one BIO column per non-leaf type) of a tree.
+
+        Parameters
+        ----------
+        root_node : tree_sitter.Node
+            The root node of the AST.
+
+        Returns
+        -------
+        dict
+            Column name to list of values, in CSV column order.
+        """
+        leaf_nodes = self.get_nodes_at_level(root_node, -1)
+
+        tokens = []
+        regex_labels = []
+        append_token = tokens.append
+        append_regex_label = regex_labels.append
+        for node in leaf_nodes:
+            # node.text copies the node's bytes out of the tree on every access, so it is read once
+            text = node.text
+            append_token(self._csv_token(text))
+            append_regex_label(self.find_label_with_regex(text.decode('utf-8', 'backslashreplace')))
+        data = {'TOKEN': tokens, 'REGEX': regex_labels}
+
+        # Walk each leaf's ancestors once and reuse the result for every non-leaf type
+        ancestor_types = [self.get_ancestor_types(node) for node in leaf_nodes]
+        for non_leaf_type in NON_LEAF_TYPES:
+            bio = self.search_for_type(non_leaf_type, leaf_nodes, ancestor_types)
+            data[non_leaf_type.upper()] = bio
+
+        return data
 
 
     def get_all_bio_labels(self, source_code, language, file_name):
@@ -260,46 +645,20 @@ class PatternExtractor:
         file_name : str
             File name for generated CSV.
         """
-        if language == 'java':
-            code_language = Language(tsjava.language())
-        elif language == 'python':
-            code_language = Language(tspython.language())
-        else:
-            print("Please pick Java or Python as a language.")
+        if self.get_parser(language) is None:
             return
-        parser = Parser(code_language)
-        label_dictionary = LabelDictionary()
-        tree = parser.parse(source_code)
-        root_node = tree.root_node
-        leaf_nodes = self.get_nodes_at_level(root_node, -1)
-
-        data = {
-            'TOKEN': [
-                self.regex_conversion(node.text) for node in leaf_nodes
-            ],
-            'REGEX': [self.find_label_with_regex(str(node.text)[2:-1]) for node in leaf_nodes]
-        }
-
-        for non_leaf_type in label_dictionary.non_leaf_types:
-            bio = self.search_for_type(non_leaf_type, leaf_nodes, label_dictionary)
-            data[non_leaf_type.upper()] = bio
-
-        data['TOKEN'] = [
-            re.sub(r'\\\\u', r'\\u',
-                   re.sub(r'\\\\([nrt"\'])', r'\\\1', token))
-            for token in data['TOKEN']
-        ]
-
-        # Fix any residual issues with slashes
-        data['TOKEN'] = [
-            re.sub(r'\\\\\\(?=\S)', 'FILL_WITH_ONE_SLASH', token).replace('FILL_WITH_ONE_SLASH', '\\\\')
-            if 'FILL_WITH_ONE_SLASH' in token else re.sub(r'\\\\\\(?=\S)', '\\\\', token)
-            for token in data['TOKEN']
-        ]
-
-        df = pd.DataFrame(data)
-
-        df.to_csv(file_name + '.csv', index=False, escapechar='\\')
+        namespace = f"bio-csv:{language}:{GRAMMAR_VERSIONS[language]}"
+        data = None if self.cache is None else self.cache.get(namespace, source_code)
+        if data is None:
+            data = self._csv_columns(self._parse_document(source_code, language, file_name).root_node)
+            if self.cache is not None:
+                self.cache.put(namespace, source_code, data)
+
+        # Same dialect as DataFrame.to_csv(index=False, escapechar='\\'), without importing pandas
+        with open(file_name + '.csv', 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file, lineterminator=os.linesep, escapechar='\\')
+            writer.writerow(data.keys())
+            writer.writerows(zip(*data.values()))
 
 
 # def main():
@@ -3,11 +3,56 @@ import re
 import time
 
 from .extract_patterns import PatternExtractor
-from .label_dictionary import LabelDictionary
+from .label_dictionary import NON_LEAF_TYPES
 import os
 
 start_time = time.time()
 
+_NON_ASCII = re.compile(r'[^\x00-\x7F]+')
+# Bytes deleted by _clean_source: everything outside ASCII
+_HIGH_BYTES = bytes(range(0x80, 0x100))
+
+
+def _encode_lines(text):
+    """
+    Encodes text for a file opened in binary mode, keeping the line endings text mode would write.
+
+    Parameters
+    ----------
+    text : str
+        The text to be written, with '\\n' line endings.
+
+    Returns
+    -------
+    bytes
+        The UTF-8 encoded text with the platform's line endings.
+    """
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode('utf-8')
+
+
+def _clean_source(source):
+    """
+    Normalises raw source code the way read_file sees it, without decoding it.
+
+    Every byte of a multi-byte UTF-8 sequence is non-ASCII, so deleting non-ASCII bytes
+    removes the same characters as removing them from the decoded text. bytes.translate
+    deletes them in one table-driven pass, without the regex engine.
+
+    Parameters
+    ----------
+    source : bytes
+        The UTF-8 encoded source code, as read from the file.
+
+    Returns
+    -------
+    bytes
+        The ASCII source with universal newlines translated to b'\n' and non-ASCII bytes removed.
+    """
+    return source.replace(b'\r\n', b'\n').replace(b'\r', b'\n').translate(None, _HIGH_BYTES)
+
+
 class TokenLabelFilesGenerator:
     def read_file(self, file_name):
         """
@@ -23,24 +68,23 @@ class TokenLabelFilesGenerator:
             A list of each element in the given text file.
         """
         with open(file_name, encoding="utf-8") as file:
-            strings = []
-            st = ''
-            for line in file:
-                line = re.sub(r'[^\x00-\x7F]+', '', line)
-                # line = line.decode('utf-8', 'ignore').encode("utf-8")
-                st += line
-            strings.append(st)
-        return strings
+            # Read and clean the whole file at once instead of concatenating it line by line;
+            # newlines are ASCII, so stripping non-ASCII runs gives the same result either way
+            return [_NON_ASCII.sub('', file.read())]
 
 
-    def write_file(self, file_name, string, tokens, labels):
+    def write_file(self, file_in, file_labels, file_bio, string, tokens, labels):
         """
         Helper method that writes to the .in and .label files.
 
         Parameters
         ----------
-        file_name : str
-            The name of the text file containing elements to be written to the .in and .label files.
+        file_in : BinaryIO
+            Open .in file to write the tokens to.
+        file_labels : BinaryIO
+            Open .label file to write the label names to.
+        file_bio : BinaryIO
+            Open .bio file to write the BIO tags to.
         string : str
             The element to be parsed.
         tokens : List[str]
@@ -51,26 +95,37 @@ class TokenLabelFilesGenerator:
         prev = 0
         token_index = 0
         token_str = ''
+        # token_str without backslashes, extended per token instead of recomputed from scratch
+        clean_token_str = ''
         token_iter = iter(tokens)
         cut_to_next_line = True
-
-        with (open(file_name + '.in', 'a') as file_in, open(file_name + '.label', 'a') as file_labels,
-              open(file_name + '.bio', 'w') as file_bio):
+        # Split every label into its BIO tag and label name once, not once per line
+        label_names = [label[2:] for label in labels]
+        bio_tags = [label[:1] for label in labels]
+        # Output is collected per string and written in one call at the end
+        in_parts = []
+        label_parts = []
+        bio_parts = []
+        write_in = in_parts.append
+        write_label = label_parts.append
+        write_bio = bio_parts.append
+
+        try:
             lines = string.split('\n')
             line_enum = iter(lines)
             # enumerate through a line of the file
             for i, line in enumerate(line_enum):
                 if len(line.strip()) == 0:
-                    file_in.write('\n')
-                    file_labels.write('\n')
-                    file_labels.write('\n')
+                    write_in('\n')
+                    write_label('\n\n')
                     continue
                 # if multiline comment
                 elif line.lstrip()[:2] == '/*' and len(tokens[prev:token_index+1]) > 0:
-                    file_in.write(' '.join(tokens[prev:token_index+1]).strip() + '\n')
-                    file_labels.write(' '.join(label[2:] for label in labels[prev:token_index+1]).replace(' ', '') + '\n')
-                    file_bio.write(' '.join(label[0] for label in labels[prev:token_index+1]).replace(' ', '') + '\n')
+                    write_in(' '.join(tokens[prev:token_index+1]).strip() + '\n')
+                    write_label(' '.join(label_names[prev:token_index+1]).replace(' ', '') + '\n')
+                    write_bio(' '.join(bio_tags[prev:token_index+1]).replace(' ', '') + '\n')
                     token_str = ''
+                    clean_token_str = ''
                     for it in range(''.join(tokens[prev:token_index+1]).count('\n')):
                         next(line_enum)
                     prev = token_index + 1
@@ -79,6 +134,7 @@ class TokenLabelFilesGenerator:
                     continue
 
                 line = line.replace(" ", "")
+                test_line = line.replace('\\', '').strip().replace('\t', '')
 
                 while abs(prev - token_index < 500):  # temp condition
                     t = next(token_iter)
@@ -89,8 +145,8 @@ class TokenLabelFilesGenerator:
                         stripped_t = stripped_t.replace('\\\\', '\\')
 
                     token_str += stripped_t
-                    test_token_str = token_str.replace('\\', '').strip()
-                    test_line = line.replace('\\', '').strip().replace('\t', '')
+                    clean_token_str += stripped_t.replace('\\', '')
+                    test_token_str = clean_token_str.strip()
                     t_count = t.count('\n')
 
                     if t_count > 0:
@@ -106,23 +162,30 @@ class TokenLabelFilesGenerator:
                         cut_to_next_line = True
                         break
 
-                file_in.write(' '.join(tokens[prev:token_index]) + ' ')
-                file_labels.write(' '.join(label[2:] for label in labels[prev:token_index]) + ' ')
-                file_bio.write(' '.join(label[0] for label in labels[prev:token_index]) + ' ')
+                write_in(' '.join(tokens[prev:token_index]) + ' ')
+                write_label(' '.join(label_names[prev:token_index]) + ' ')
+                write_bio(' '.join(bio_tags[prev:token_index]) + ' ')
 
                 if cut_to_next_line:
-                    file_in.write('\n')
-                    file_labels.write('\n')
-                    file_labels.write('\n')
+                    write_in('\n')
+                    write_label('\n\n')
 
                 if token_str.find('\n') > -1 and cut_to_next_line:
                     next(line_enum)
 
                 token_str = ''
+                clean_token_str = ''
                 prev = token_index
+        finally:
+            # Keep whatever was produced before an error, as the per-line writes did; each file
+            # gets one pre-encoded write that bypasses the text layer
+            file_in.write(_encode_lines(''.join(in_parts)))
+            file_labels.write(_encode_lines(''.join(label_parts)))
+            file_bio.write(_encode_lines(''.join(bio_parts)))
 
 
-    def generate_in_label_bio_files(self, source_file, language, label_type):
+    def generate_in_label_bio_files(self, source_file, language, label_type, cache=None, source_code=None,
+                                    output_dir='output'):
         """
         Generates .in, .label, and .bio files for the given text file.
 
@@ -134,26 +197,29 @@ class TokenLabelFilesGenerator:
             The language to extra labels in.
         label_type : str
             The desired label (non-leaf) to be parsed.
+        cache : ASTCache, optional
+            Cache of the labels of previously seen sources, reused when the CSV is regenerated.
+        source_code : bytes, optional
+            The raw contents of source_file, used instead of reading the file again.
+        output_dir : str, optional
+            Directory the .csv, .in, .label and .bio files are written to.
         """
-        label_dictionary = LabelDictionary()
-        file_name = 'output/' + os.path.basename(source_file).split('.')[0]
+        file_name = os.path.join(output_dir, os.path.basename(source_file).split('.')[0])
         tokens = []
         bio_labels = []
-        with (open(file_name + '.in', 'w') as file_in, open(file_name + '.label', 'w') as file_label,
-              open(file_name + '.bio', 'w') as file_bio):
-            file_in.write('')
-            file_label.write('')
-            file_bio.write('')
-
-
-        strings = self.read_file(source_file)
+        if source_code is None:
+            strings = self.read_file(source_file)
+            sources = (bytes(st, encoding='utf8') for st in strings)
+        else:
+            sources = [_clean_source(source_code)]
+            strings = [source.decode('ascii') for source in sources]
 
         if not os.path.isfile(file_name + '.csv'):
             print("No CSV Found")
-            extractor = PatternExtractor()
+            extractor = PatternExtractor(cache)
             # strings = self.read_file(source_file)
-            for st in strings:
-                extractor.get_all_bio_labels(bytes(st, encoding='utf8'), language, file_name)
+            for source in sources:
+                extractor.get_all_bio_labels(source, language, file_name)
         print("CSV Finished")
         elapsed_time = time.time() - start_time
         print(f"Elapsed time: {elapsed_time:.2f} seconds")
@@ -164,13 +230,17 @@ class TokenLabelFilesGenerator:
             next(iter_csv)
             for i, lines in enumerate(iter_csv):
                 tokens.append(lines[0])
-                bio_labels.append(lines[label_dictionary.non_leaf_types[label_type]])
+                bio_labels.append(lines[NON_LEAF_TYPES[label_type]])
         print("Appending Finished")
         elapsed_time = time.time() - start_time
         print(f"Elapsed time: {elapsed_time:.2f} seconds")
 
-        for st in strings:
-            self.write_file(file_name, st, tokens, bio_labels)
+        # Opened once for all strings rather than once per string in write_file
+        with (open(file_name + '.in', 'wb') as file_in,
+              open(file_name + '.label', 'wb') as file_labels,
+              open(file_name + '.bio', 'wb') as file_bio):
+            for st in strings:
+                self.write_file(file_in, file_labels, file_bio, st, tokens, bio_labels)
         print("Writing Finished")
         elapsed_time = time.time() - start_time
         print(f"Elapsed time: {elapsed_time:.2f} seconds")
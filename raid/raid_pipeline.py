@@ -12,23 +12,34 @@ The pipeline performs the following steps:
 4. Generates input and label files in BIO format
 
 Command Line Arguments:
-    file: Path to the Java source file
+    file: Path to the Java source file, or to a directory of .java files
     --model: Transformer model name (default: 'bert-base-uncased')
-    --device: Computing device ('cpu' or 'cuda', default: 'cpu')
+    --device: Computing device ('auto', 'cpu' or 'cuda', default: 'auto', CUDA when available)
     --binary_filter: Filter for token labeling (default: 'set:public,static')
     --output_prefix: Prefix for output files (default: 'output')
     --aggregation_method: Method for aggregating activations (default: 'mean')
     --label: Non-leaf type for token categorization (default: 'leaves')
     --layer: Specific transformer layer to extract (default: all layers)
+    --quantize: Store aggregated and last-layer activations as int8 in .npz files instead of text
+    --binary_activations: Store aggregated (.npy) and phrase (.npz) activations as float32 instead of JSON
+    --dtype: Precision of transformer inference ('fp32', 'bf16' or 'fp16', default: 'fp32')
+    --compile: Wrap the transformer with torch.compile
+    --stream_activations: Stream the activation JSON with ijson to lower peak memory
+    --no_ast_cache: Always re-parse the source instead of reusing cached AST tokens and labels
+    --verbose: Print the type, text and depth of every extracted token
+    --jobs: Worker processes used for the files of a directory (default: one per CPU)
 """
 
 import os
 import sys
 import argparse
-from typing import NoReturn
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, NoReturn, Optional, Tuple
 from pathlib import Path
 
 # Import necessary classes from other modules
+from .ast_cache import ASTCache
 from .ast_token_activator import JavaASTProcessor, ActivationAnnotator
 from .extract_patterns import PatternExtractor
 from .generate_files import TokenLabelFilesGenerator
@@ -53,13 +64,13 @@ def main() -> NoReturn:
     # Set up argument parser
     parser_arg = argparse.ArgumentParser(description='RAID pipeline for processing Java code.')
     parser_arg.add_argument('file', 
-                           help='Path to the Java source file.')
+                           help='Path to the Java source file, or to a directory of .java files.')
     parser_arg.add_argument('--model', 
                            default='bert-base-uncased',
                            help='Transformer model for activations.')
     parser_arg.add_argument('--device', 
-                           default='cpu',
-                           help='Device to run the model on ("cpu" or "cuda").')
+                           default='auto',
+                           help='Device to run the model on ("auto", "cpu" or "cuda"); "auto" uses CUDA when available.')
     parser_arg.add_argument('--binary_filter',
                            default='set:public,static',
                            help='Binary filter for labeling.')
@@ -76,41 +87,198 @@ def main() -> NoReturn:
                            type=int,
                            default=None,
                            help='Specific transformer layer to extract (default: all layers)')
+    output_format = parser_arg.add_mutually_exclusive_group()
+    output_format.add_argument('--quantize',
+                              action='store_true',
+                              help='Store aggregated and last-layer activations as int8 (.npz) instead of text.')
+    output_format.add_argument('--binary_activations',
+                              action='store_true',
+                              help='Store aggregated (.npy) and phrase (.npz) activations as float32 instead of JSON.')
+    parser_arg.add_argument('--dtype',
+                           choices=['fp32', 'bf16', 'fp16'],
+                           default='fp32',
+                           help='Precision of transformer inference; bf16 and fp16 run the model under autocast.')
+    parser_arg.add_argument('--compile',
+                           action='store_true',
+                           help='Wrap the transformer with torch.compile; worthwhile for large inputs, mainly on CUDA.')
+    parser_arg.add_argument('--stream_activations',
+                           action='store_true',
+                           help='Stream the activation JSON with ijson (must be installed); lowers peak memory on large files but parses about twice as slowly.')
+    parser_arg.add_argument('--no_ast_cache',
+                           action='store_true',
+                           help='Re-parse the source instead of reusing tokens and labels cached in the output directory.')
+    parser_arg.add_argument('--verbose',
+                           action='store_true',
+                           help='Print the type, text and depth of every extracted token.')
+    parser_arg.add_argument('--jobs',
+                           type=int,
+                           default=None,
+                           help='Worker processes for the files of a directory (default: one per CPU).')
     args = parser_arg.parse_args()
 
     java_file_path = args.file
 
     # Validate input file existence
-    if not os.path.isfile(java_file_path):
+    if os.path.isdir(java_file_path):
+        java_file_paths = sorted(str(path) for path in Path(java_file_path).glob('*.java'))
+        if not java_file_paths:
+            print(f"Error: Directory '{java_file_path}' contains no .java files.")
+            sys.exit(1)
+    elif os.path.isfile(java_file_path):
+        java_file_paths = None
+    else:
         print(f"Error: File '{java_file_path}' does not exist.")
         sys.exit(1)
 
     # Create output directory in the current working directory instead of package directory
     output_dir = os.path.join(os.getcwd(), 'output')
-    if not os.path.exists(output_dir):
-        try:
-            os.makedirs(output_dir)
-        except OSError as e:
-            print(f"Error creating output directory: {e}")
-            sys.exit(1)
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating output directory: {e}")
+        sys.exit(1)
+
+    # Results derived from unchanged sources are reused from the output directory
+    cache_path = None if args.no_ast_cache else os.path.join(output_dir, '.ast_cache.sqlite')
+    if java_file_paths is not None:
+        run_directory_pipeline(args, java_file_paths, output_dir, cache_path)
+        return
+
+    ast_cache = None if cache_path is None else ASTCache(cache_path)
+    try:
+        run_pipeline(args, java_file_path, output_dir, ast_cache)
+    finally:
+        if ast_cache is not None:
+            ast_cache.close()
+
+
+def run_pipeline(args: argparse.Namespace, java_file_path: str, output_dir: str,
+                 ast_cache: ASTCache = None) -> None:
+    """
+    Run the pipeline steps for one Java file.
+
+    Args:
+        args: Parsed command line arguments
+        java_file_path: Path to the Java source file
+        output_dir: Directory for output files
+        ast_cache (ASTCache, optional): Cache of results derived from parsed sources
+    """
+    ast_processor = extract_tokens(java_file_path, output_dir, ast_cache, args.verbose)
+    annotate_activations(args, ast_processor.tokens_tuples, output_dir)
+    generate_label_files(java_file_path, args.label, ast_cache, ast_processor.source_bytes, output_dir)
+
+
+def run_directory_pipeline(args: argparse.Namespace, java_file_paths: List[str], output_dir: str,
+                           cache_path: Optional[str] = None) -> None:
+    """
+    Run the pipeline steps for several Java files.
+
+    Token extraction and label files are produced by a pool of worker processes, since
+    the AST walks and labeling are pure Python. Activations are generated in this
+    process as each file's tokens arrive, so the transformer model is loaded only once.
+    The token, label and activation outputs of each file go to a subdirectory named after it.
+
+    Args:
+        args: Parsed command line arguments
+        java_file_paths: Paths to the Java source files
+        output_dir: Directory for output files
+        cache_path (str, optional): Path of the ASTCache database shared by the workers
+    """
+    file_output_dirs = [os.path.join(output_dir, Path(path).stem) for path in java_file_paths]
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = executor.map(process_file, java_file_paths, file_output_dirs,
+                               repeat(cache_path), repeat(args.label), repeat(args.verbose),
+                               chunksize=4)
+        for file_output_dir, tokens_tuples in zip(file_output_dirs, results):
+            annotate_activations(args, tokens_tuples, file_output_dir)
+
 
-    # Initialize and process AST
-    ast_processor = JavaASTProcessor(java_file_path, output_dir)
+def process_file(java_file_path: str, output_dir: str, cache_path: Optional[str],
+                 label: str, verbose: bool = False) -> List[Tuple[str, str, int]]:
+    """
+    Extract the tokens and write the label files of one Java file, in a worker process.
+
+    Args:
+        java_file_path: Path to the Java source file
+        output_dir: Directory for the file's token and label output, created if missing
+        cache_path (str, optional): Path of the ASTCache database. If None, no cache is used.
+        label: Non-leaf type the label files categorize tokens by
+        verbose: Print the type, text and depth of every extracted token
+
+    Returns:
+        List of (token_type, token_text, depth) tuples of the file
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ast_cache = None if cache_path is None else ASTCache(cache_path)
+    try:
+        ast_processor = extract_tokens(java_file_path, output_dir, ast_cache, verbose)
+        generate_label_files(java_file_path, label, ast_cache, ast_processor.source_bytes, output_dir)
+    finally:
+        if ast_cache is not None:
+            ast_cache.close()
+    return ast_processor.tokens_tuples
+
+
+def extract_tokens(java_file_path: str, output_dir: str, ast_cache: ASTCache = None,
+                   verbose: bool = False) -> JavaASTProcessor:
+    """
+    Extract the AST tokens of a Java file and write them to the output directory.
+
+    Args:
+        java_file_path: Path to the Java source file
+        output_dir: Directory for output files
+        ast_cache (ASTCache, optional): Cache of results derived from parsed sources
+        verbose: Print the type, text and depth of every extracted token
+
+    Returns:
+        The processor, holding the raw source and the extracted tokens
+    """
+    ast_processor = JavaASTProcessor(java_file_path, output_dir, cache=ast_cache, verbose=verbose)
     ast_processor.process_ast()
+    return ast_processor
+
 
-    # Process activations and annotate data
+def annotate_activations(args: argparse.Namespace, tokens_tuples: List[Tuple[str, str, int]],
+                         output_dir: str) -> None:
+    """
+    Generate, annotate and aggregate the activations of extracted tokens.
+
+    Args:
+        args: Parsed command line arguments
+        tokens_tuples: List of (token_type, token_text, depth) tuples
+        output_dir: Directory holding the written tokens, and for output files
+    """
     activation_annotator = ActivationAnnotator(
         model_name=args.model,
         device=args.device,
         binary_filter=args.binary_filter,
         output_prefix=os.path.join(output_dir, args.output_prefix),
-        layer=args.layer
+        layer=args.layer,
+        quantize=args.quantize,
+        binary_output=args.binary_activations,
+        dtype=args.dtype,
+        compile_model=args.compile,
+        stream_activations=args.stream_activations
     )
-    activation_annotator.process_activations(ast_processor.tokens_tuples, output_dir)
+    activation_annotator.process_activations(tokens_tuples, output_dir)
 
-    # Generate .in and .label files using TokenLabelFilesGenerator
+
+def generate_label_files(java_file_path: str, label: str, ast_cache: ASTCache = None,
+                         source_code: Optional[bytes] = None, output_dir: str = 'output') -> None:
+    """
+    Generate the .in, .label and .bio files of a Java file using TokenLabelFilesGenerator.
+
+    Args:
+        java_file_path: Path to the Java source file
+        label: Non-leaf type the label files categorize tokens by
+        ast_cache (ASTCache, optional): Cache of results derived from parsed sources
+        source_code (bytes, optional): Source already read from java_file_path, so the
+                                     file is not read a second time
+        output_dir: Directory for the label files
+    """
     generator = TokenLabelFilesGenerator()
-    generator.generate_in_label_bio_files(java_file_path, 'java', args.label)
+    generator.generate_in_label_bio_files(java_file_path, 'java', label, cache=ast_cache,
+                                          source_code=source_code, output_dir=output_dir)
 
 
 if __name__ == "__main__":
@@ -89,6 +89,7 @@ setup(
         "mpmath==1.3.0",
         "networkx==3.3",
         "numpy==1.26.4",
+        "orjson==3.10.7",
         "pandas==2.2.3",
         "pillow==10.4.0",
         "psutil==6.0.0",
@@ -3,12 +3,14 @@ import sys
 import argparse
 from tree_sitter import Parser, Language
 import tree_sitter_java as tsjava
-import graphviz
 
 # Initialize the Java language
 JAVA_LANGUAGE = Language(tsjava.language())
 parser = Parser(JAVA_LANGUAGE)
 
+# Rendered graphs go to the repository's output folder
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+
 def read_source_code(file_path: str) -> bytes:
     """
     Reads the source code from the given file path.
@@ -17,51 +19,97 @@ def read_source_code(file_path: str) -> bytes:
         file_path (str): Path to the source code file.
 
     Returns:
-        bytes: The source code encoded in UTF-8.
+        bytes: The source code encoded in UTF-8, with newlines translated as text mode would.
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
+    # Read as bytes rather than decoding to str and encoding back; only the newline
+    # translation of text mode is kept
+    with open(file_path, 'rb') as file:
         source_code = file.read()
-    return source_code.encode('utf-8')
+    return source_code.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
 
 def extract_tokens(node):
     """
-    Recursively extracts tokens from the AST.
+    Extracts the named tokens of the AST in pre-order, walking it with a tree cursor.
 
     Args:
-        node: The current node in the AST.
+        node: The root node of the AST.
 
     Returns:
         list: A list of tuples containing token types and their text.
     """
     tokens = []
-    if node.is_named:
-        tokens.append((node.type, node.text.decode('utf-8')))
-    for child in node.children:
-        tokens.extend(extract_tokens(child))
-    return tokens
+    cursor = node.walk()
+    while True:
+        current = cursor.node
+        if current.is_named:
+            tokens.append((current.type, current.text.decode('utf-8')))
+        if cursor.goto_first_child():
+            continue
+        # climb back up until a sibling is found; the cursor never leaves the starting node
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return tokens
+
+def _dot_quote(text):
+    """
+    Quotes text as a DOT string.
+
+    Args:
+        text (str): The text to quote.
+
+    Returns:
+        str: The text in double quotes, with backslashes and quotes escaped.
+    """
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
 
-def visualize_ast(node, graph, parent_id=None):
+def visualize_ast(node):
     """
-    Recursively builds the AST visualization.
+    Builds the AST visualization as DOT source, walking the tree with a tree cursor.
+
+    The DOT statements are collected as strings and handed to Graphviz at once, rather
+    than added node by node through a graphviz.Digraph.
 
     Args:
-        node: The current node in the AST.
-        graph: The Graphviz graph object.
-        parent_id: The identifier of the parent node.
+        node: The root node of the AST.
+
+    Returns:
+        graphviz.Source: The DOT graph of the AST.
     """
-    node_id = str(id(node))
-    label = f"{node.type} [{node.start_point}-{node.end_point}]"
-    graph.node(node_id, label)
-    if parent_id:
-        graph.edge(parent_id, node_id)
-    for child in node.children:
-        visualize_ast(child, graph, node_id)
+    import graphviz
+
+    lines = ['digraph {']
+    cursor = node.walk()
+    # graph identifiers of the current node's ancestors, innermost last
+    parent_ids = [None]
+    # nodes are numbered in visiting order, which keeps the identifiers short
+    node_count = 0
+    while True:
+        current = cursor.node
+        node_id = str(node_count)
+        node_count += 1
+        # points as plain (row, column) tuples rather than Point(row=..., column=...)
+        label = f"{current.type} [{tuple(current.start_point)}-{tuple(current.end_point)}]"
+        lines.append(f'\t{node_id} [label={_dot_quote(label)}]')
+        if parent_ids[-1] is not None:
+            lines.append(f'\t{parent_ids[-1]} -> {node_id}')
+        if cursor.goto_first_child():
+            parent_ids.append(node_id)
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                lines.append('}')
+                return graphviz.Source('\n'.join(lines) + '\n')
+            parent_ids.pop()
 
 
 def main():
     # Set up argument parser
     parser_arg = argparse.ArgumentParser(description='Parse Java code and generate AST visualization.')
     parser_arg.add_argument('file', help='Path to the Java source file.')
+    parser_arg.add_argument('--no_visualize', action='store_true',
+                            help='Only print the tokens, without rendering the AST.')
+    parser_arg.add_argument('--visualize_max_nodes', type=int, default=None,
+                            help='Skip rendering ASTs with more nodes than this (default: no limit).')
     args = parser_arg.parse_args()
 
     java_file_path = args.file
@@ -85,21 +133,24 @@ def main():
     for token_type, token_text in tokens:
         print(f"Type: {token_type}, Text: {token_text}")
 
+    # Rendering dominates the runtime on large files, so it can be skipped
+    if args.no_visualize:
+        return
+    if args.visualize_max_nodes is not None and root_node.descendant_count > args.visualize_max_nodes:
+        print(f"\nAST has {root_node.descendant_count} nodes, more than --visualize_max_nodes; "
+              "skipping visualization.")
+        return
+
     # Visualize the AST
-    graph = graphviz.Digraph(format="png")
-    visualize_ast(root_node, graph)
+    graph = visualize_ast(root_node)
     
     # Create an output filename based on input file name
     output_filename = os.path.splitext(os.path.basename(java_file_path))[0] + '_ast'
 
     # Make output folder
-    base_dir = os.path.dirname(os.path.abspath(__file__))  
-    output_dir = os.path.join(base_dir, '..', 'output')    
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     
-    output_path = os.path.join(output_dir, output_filename)
+    output_path = os.path.join(OUTPUT_DIR, output_filename)
     graph.render(output_path, format='png', cleanup=True)
     
     print(f"\nAST visualization saved as '{output_path}.png'.")
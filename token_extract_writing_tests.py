@@ -1,44 +1,49 @@
 import os
-import re
+import sqlite3
+import tempfile
+import threading
 import unittest
+from pathlib import Path
+from unittest.mock import patch
+from raid.ast_cache import CACHE_FORMAT_VERSION, ASTCache
+from raid.ast_utils import parse_incrementally
+from raid.extract_patterns import _PARSER_LOCAL, PatternExtractor
 from raid.generate_files import TokenLabelFilesGenerator
-from raid.label_dictionary import LabelDictionary
+
+_HIGH_BYTES = bytes(range(0x80, 0x100))
+# Spaces are dropped anywhere in a line; tabs inside string literals are kept
+_DROP_SPACES = str.maketrans('', '', ' ')
 
 
 class RAIDTokenFunctions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The generator holds no per-file state, so one instance serves every test
+        cls.generator = TokenLabelFilesGenerator()
+
+    def setUp(self):
+        # Inputs and generated files live in a per-test directory, removed in one go
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.test_dir = self._tmp.name
+
     def confirm_equivalence(self, text, array_string):
-        file_path = "input/test_file.txt"
-
-        try:
-            if not isinstance(text, bytes):
-                text = re.sub(r'[^\x00-\x7F]+', '', text)
-                text = bytes(text, 'utf-8')
-
-            with open(file_path, "wb") as f:
-                f.write(text)
-
-            g = TokenLabelFilesGenerator()
-            g.generate_in_label_bio_files('input/test_file.txt', 'java', 'program')
-
-            with open(file_path, "r") as f:
-                lines = f.readlines()
-
-            for i, line in enumerate(lines):
-                line = line.strip().replace(' ', '')
-                self.assertTrue(line == array_string[i], 'Lines are not equal, ' + line + ' vs ' + array_string[i])
-
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            file_name = 'output/' + os.path.basename(file_path).split('.')[0]
-            if os.path.exists(file_name + '.in'):
-                os.remove(file_name + '.in')
-            if os.path.exists(file_name + '.label'):
-                os.remove(file_name + '.label')
-            if os.path.exists(file_name + '.bio'):
-                os.remove(file_name + '.bio')
-            if os.path.exists(file_name + '.csv'):
-                os.remove(file_name + '.csv')
+        file_path = os.path.join(self.test_dir, "test_file.txt")
+
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8').translate(None, _HIGH_BYTES)
+
+        with open(file_path, "wb") as f:
+            f.write(text)
+
+        self.generator.generate_in_label_bio_files(file_path, 'java', 'program', output_dir=self.test_dir)
+
+        # Reads back the input file, not the generated .in file, which holds one token per line
+        with open(file_path, "r") as f:
+            actual = [line.translate(_DROP_SPACES).strip() for line in f]
+
+        # Expected lists end with '' for the end of the file
+        self.assertEqual(actual + [''], array_string)
 
     def test_multiline_code(self):
         bytestring = b'''for (StackTraceElement myStackElement : getStackTrace()) {
@@ -226,6 +231,107 @@ class RAIDTokenFunctions(unittest.TestCase):
         self.confirm_equivalence(bytestring, array_string)
 
 
+    def test_source_code_matches_file_read(self):
+        text = 'class A {\r\n    String s = "─x";\r\n    // done\r}\n'
+        file_path = os.path.join(self.test_dir, "test_source.txt")
+        file_name = os.path.join(self.test_dir, "test_source")
+        outputs = []
+        with open(file_path, "wb") as f:
+            f.write(text.encode('utf-8'))
+        for source_code in (None, text.encode('utf-8')):
+            # Regenerate the CSV for each source; there is none before the first run
+            Path(file_name + '.csv').unlink(missing_ok=True)
+            self.generator.generate_in_label_bio_files(file_path, 'java', 'program', source_code=source_code,
+                                                       output_dir=self.test_dir)
+            outputs.append([open(file_name + ext, 'rb').read() for ext in ('.in', '.label', '.bio')])
+
+        self.assertEqual(outputs[0], outputs[1])
+
+class RAIDLabelCache(unittest.TestCase):
+    def test_cached_csv_matches_parsed_csv(self):
+        source_code = b'''public int addNumbers(int a, int b) {
+            return a + b;
+        }'''
+
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = ASTCache(os.path.join(test_dir, 'cache.sqlite'))
+            try:
+                extractor = PatternExtractor(cache)
+                extractor.get_all_bio_labels(source_code, 'java', os.path.join(test_dir, 'parsed'))
+                with patch.object(PatternExtractor, '_csv_columns') as csv_columns:
+                    extractor.get_all_bio_labels(source_code, 'java', os.path.join(test_dir, 'cached'))
+                csv_columns.assert_not_called()
+            finally:
+                cache.close()
+
+            with open(os.path.join(test_dir, 'parsed.csv')) as parsed, \
+                    open(os.path.join(test_dir, 'cached.csv')) as cached:
+                self.assertEqual(parsed.read(), cached.read())
+
+    def test_cache_values_and_format_version(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = ASTCache(os.path.join(test_dir, 'cache.sqlite'))
+            try:
+                tokens = [('class', 'class', 2), ('identifier', 'A', 2)]
+                cache.put('tokens', b'class A {}', tokens)
+                self.assertEqual(cache.get('tokens', b'class A {}'), tokens)
+                with self.assertRaises(ValueError):
+                    cache.put('tokens', b'class A {}', [object()])
+                # Entries written under another format version are not served
+                with patch('raid.ast_cache.CACHE_FORMAT_VERSION', CACHE_FORMAT_VERSION + 1):
+                    self.assertIsNone(cache.get('tokens', b'class A {}'))
+            finally:
+                cache.close()
+
+    def test_cache_waits_for_concurrent_writer(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            db_path = os.path.join(test_dir, 'cache.sqlite')
+            cache = ASTCache(db_path)
+            # Another process's write transaction, committed while the cache is waiting on it
+            writer = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            try:
+                self.assertEqual(cache.connection.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+                writer.execute("BEGIN IMMEDIATE")
+                timer = threading.Timer(0.2, writer.execute, ("COMMIT",))
+                timer.start()
+                cache.put('labels', b'class A {}', ['O'])
+                timer.join()
+                self.assertEqual(cache.get('labels', b'class A {}'), ['O'])
+            finally:
+                writer.close()
+                cache.close()
+
+    def test_incremental_parse_matches_fresh_parse(self):
+        extractor = PatternExtractor()
+        before = b'public class A {\n    int x = 1;\n}'
+        after = b'public class A {\n    int x = 1;\n    int y = 2;\n}'
+        extractor._parse_document(before, 'java', 'A')
+        incremental = extractor._parse_document(after, 'java', 'A')
+        fresh = extractor.get_parser('java').parse(after)
+        self.assertEqual(str(incremental.root_node), str(fresh.root_node))
+        self.assertEqual(incremental.root_node.children[0].end_point, fresh.root_node.children[0].end_point)
+
+    def test_parse_reuses_only_the_same_document(self):
+        extractor = PatternExtractor()
+        before = b'public class A {\n    int x = 1;\n}'
+        after = b'public class A {\n    int x = 1;\n    int y = 2;\n}'
+        # Start from an empty tree cache, since other tests share this thread's cache
+        with patch.dict(_PARSER_LOCAL.__dict__, {'recent_trees': {}}), \
+                patch('raid.extract_patterns.parse_incrementally',
+                      wraps=parse_incrementally) as parse:
+            extractor._parse_document(before, 'java', 'A')
+            extractor._parse_document(after, 'java', 'B')
+            self.assertIsNone(parse.call_args.args[2])
+            extractor._parse_document(after, 'java', 'A')
+            self.assertEqual(parse.call_args.args[2][0], before)
+
+        # Public parses start from scratch and their trees are never edited afterwards
+        tree = extractor.parse(before, 'java')
+        extractor.parse(after, 'java')
+        extractor._parse_document(after, 'java', 'A')
+        self.assertEqual(tree.root_node.end_byte, len(before))
+
+
 if __name__ == '__main__':
     unittest.main()
     
\ No newline at end of file